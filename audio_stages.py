@@ -0,0 +1,56 @@
+import numpy as np
+from streaming import downmix_block, to_int16
+from resampler import resample_poly
+
+# Shared array stages for the converters. Audio moves between stages as int16
+# ndarrays shaped (frames, channels); stereo is never split into Python lists,
+# and channel access is a strided view of the interleaved frame buffer.
+
+def read_frames(wav, max_frames=None):
+    """
+    Read frames from an open wave reader as an int16 (frames, channels) array.
+
+    With a wav_reader.WavReader on a 16-bit file the array is a view of the
+    memory-mapped data chunk; with a 16-bit wave.Wave_read it is a read-only
+    view over the bytes readframes returned. Reads at most max_frames frames.
+    """
+    n_frames = wav.getnframes() if max_frames is None else min(max_frames, wav.getnframes())
+    if hasattr(wav, 'read_array'):
+        return wav.read_array(n_frames)
+    return as_frames(np.frombuffer(wav.readframes(n_frames), dtype='<i2'), wav.getnchannels())
+
+def as_frames(samples, n_channels):
+    """View interleaved int16 samples (ndarray or sequence) as (frames, channels)."""
+    return np.asarray(samples, dtype=np.int16).reshape(-1, n_channels)
+
+def interleave(frames):
+    """(frames, channels) back to the flat L, R, L, R, ... layout the headers use (a view)."""
+    return frames.reshape(-1)
+
+def duration_frames(max_seconds, framerate, n_channels):
+    """
+    Whole frames in the first max_seconds of a recording.
+
+    Every entry point cuts with this, so the trimmed WAV, the header and the
+    planners agree on the length to the frame.
+    """
+    return int(max_seconds * framerate * n_channels) // n_channels
+
+def truncate(frames, max_frames):
+    """Keep the first max_frames frames (a view)."""
+    return frames[:max_frames]
+
+def downmix(frames):
+    """Average stereo to (frames, 1) mono; mono input is returned as is."""
+    if frames.shape[1] == 1:
+        return frames
+    return downmix_block(frames)
+
+def resample(frames, original_rate, target_rate, n_out=None, quality='default'):
+    """
+    Polyphase-resample every channel of (frames, channels) in one call.
+
+    n_out defaults to frames * target_rate // original_rate. Filters come
+    from resampler's per-ratio cache; values are rounded and clipped to int16.
+    """
+    return to_int16(resample_poly(frames, original_rate, target_rate, n_out, quality))
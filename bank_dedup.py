@@ -0,0 +1,186 @@
+import os
+import re
+import argparse
+from collections import namedtuple
+import numpy as np
+from header_writer import write_sample_array
+from sample_bank import load_track
+
+BLOCK_SAMPLES = 256       # power of two, so the firmware splits an index with a shift and a mask
+SILENT_BLOCK = 0xFFFF     # index entry for a block that is all zeros; it has no pool storage
+
+# Per-track result: blocks[i] is the pool block (or SILENT_BLOCK) holding samples
+# i * block_samples .. (i + 1) * block_samples - 1 of the interleaved track
+DedupTrack = namedtuple('DedupTrack', ['name', 'var_name', 'n_samples', 'rate', 'channels', 'blocks',
+                                       'n_silent', 'n_shared'])
+
+DedupBank = namedtuple('DedupBank', ['block_samples', 'pool', 'tracks'])
+
+def c_identifier(name):
+    """
+    A track name as a lowercase C identifier for the generated arrays and defines.
+
+    Anything outside [0-9A-Za-z_] becomes '_', and a leading digit gets a
+    track_ prefix (120-bpm-loop -> track_120_bpm_loop), since a bare leading
+    '_' before the upper-case defines would be a reserved name.
+    """
+    ident = re.sub(r'[^0-9A-Za-z_]', '_', name).lower()
+    return f'track_{ident}' if not ident or ident[0].isdigit() else ident
+
+def split_blocks(samples, block_samples=BLOCK_SAMPLES):
+    """int16 samples as (n_blocks, block_samples), the last block zero-padded."""
+    samples = np.asarray(samples, dtype=np.int16).reshape(-1)
+    n_blocks = -(-len(samples) // block_samples)
+    padded = np.zeros(n_blocks * block_samples, dtype=np.int16)
+    padded[:len(samples)] = samples
+    return padded.reshape(n_blocks, block_samples)
+
+def dedup_tracks(inputs, block_samples=BLOCK_SAMPLES, silence_threshold=0):
+    """
+    Split tracks into blocks and share identical ones across all of them.
+
+    Args:
+        inputs: Track paths (WAV or generated .h), in track-id order
+        block_samples: Block size in samples; a power of two, and even so
+                       stereo frames never straddle two blocks
+        silence_threshold: Blocks whose peak |sample| is at or below this are
+                           stored as silence. 0 (default) is lossless; a few
+                           LSB also drops dither and noise-floor tails.
+
+    Returns a DedupBank whose pool is an int16 (n_blocks, block_samples) array.
+    """
+    if block_samples < 2 or block_samples & (block_samples - 1):
+        raise ValueError(f'block_samples must be a power of two, got {block_samples}')
+    pool = []
+    pool_ids = {}
+    tracks = []
+    var_paths = {}
+    for path in inputs:
+        name, samples, rate, channels = load_track(path)
+        var_name = c_identifier(name)
+        if var_name in var_paths:
+            raise ValueError(f'{path} and {var_paths[var_name]} would both be named {var_name}; rename one')
+        var_paths[var_name] = path
+        blocks = split_blocks(samples, block_samples)
+        peaks = np.abs(blocks.astype(np.int32)).max(axis=1)
+        index = np.empty(len(blocks), dtype=np.uint16)
+        n_silent = n_shared = 0
+        for i, (block, peak) in enumerate(zip(blocks, peaks)):
+            if peak <= silence_threshold:
+                index[i] = SILENT_BLOCK
+                n_silent += 1
+                continue
+            key = block.tobytes()
+            block_id = pool_ids.get(key)
+            if block_id is None:
+                if len(pool) >= SILENT_BLOCK:
+                    raise ValueError(f'More than {SILENT_BLOCK} unique blocks; use a larger block_samples')
+                block_id = pool_ids[key] = len(pool)
+                pool.append(block)
+            else:
+                n_shared += 1
+            index[i] = block_id
+        tracks.append(DedupTrack(name, var_name, len(np.asarray(samples).reshape(-1)), rate, channels, index,
+                                 n_silent, n_shared))
+    pool = np.array(pool, dtype=np.int16).reshape(-1, block_samples)
+    return DedupBank(block_samples, pool, tracks)
+
+def flash_bytes(bank):
+    """(verbatim, deduplicated) flash bytes: plain int16 arrays vs. pool plus block indexes."""
+    verbatim = sum(t.n_samples * 2 for t in bank.tracks)
+    deduped = bank.pool.nbytes + sum(t.blocks.nbytes for t in bank.tracks)
+    return verbatim, deduped
+
+def write_dedup_header(header_filename, bank, fmt='text', prefix='bank'):
+    """
+    Write the shared block pool, per-track block indexes and track tables.
+
+    Sample i of track t is pool block index[i >> SHIFT], offset i & MASK,
+    or 0 for SILENT blocks: an O(1) lookup, given as the inline
+    <prefix>_sample(). With fmt='raw' the pool goes to a .bin next to the header.
+    C has no empty arrays, so an all-silent bank gets one zero block in the
+    pool (N_BLOCKS stays 0) and an empty track a single SILENT index entry.
+    """
+    P = prefix.upper()
+    shift = bank.block_samples.bit_length() - 1
+    base = os.path.splitext(header_filename)[0]
+    guard = os.path.basename(base).upper().replace('-', '_').replace(' ', '_') + '_H'
+    with open(header_filename, 'w') as f:
+        f.write(f'#ifndef {guard}\n#define {guard}\n\n')
+        f.write('// Generated by bank_dedup.py - regenerate instead of editing\n')
+        f.write(f'#define {P}_BLOCK_SHIFT {shift}\n')
+        f.write(f'#define {P}_BLOCK_SAMPLES {bank.block_samples}\n')
+        f.write(f'#define {P}_SILENT_BLOCK {SILENT_BLOCK:#06x}\n')
+        f.write(f'#define {P}_N_BLOCKS {len(bank.pool)}\n')
+        f.write(f'#define {P}_N_TRACKS {len(bank.tracks)}\n\n')
+
+        f.write(f'// {len(bank.pool)} unique blocks of {bank.block_samples} samples shared by all tracks\n')
+        pool = bank.pool if len(bank.pool) else np.zeros((1, bank.block_samples), dtype=np.int16)
+        write_sample_array(f, f'{prefix}_block_pool', pool, fmt, f'{base}.bin')
+
+        for t in bank.tracks:
+            V = t.var_name.upper()
+            f.write(f'// {t.name}: {t.n_samples} samples, {t.channels} ch, {t.rate} Hz, '
+                    f'{len(t.blocks)} blocks ({t.n_silent} silent, {t.n_shared} shared)\n')
+            f.write(f'const uint16_t {t.var_name}_blocks[] PROGMEM = {{\n')
+            for start in range(0, len(t.blocks), 16):
+                f.write('  ' + ', '.join(str(int(b)) for b in t.blocks[start:start + 16]) + ',\n')
+            if not len(t.blocks):
+                f.write(f'  {P}_SILENT_BLOCK,\n')
+            f.write('};\n')
+            f.write(f'#define {V}_LENGTH {t.n_samples}\n')
+            f.write(f'#define {V}_RATE {t.rate}\n')
+            f.write(f'#define {V}_CHANNELS {t.channels}\n\n')
+
+        f.write(f'static const uint16_t* const {prefix}_track_blocks[{P}_N_TRACKS] = {{'
+                + ', '.join(f'{t.var_name}_blocks' for t in bank.tracks) + '};\n')
+        f.write(f'static const uint32_t {prefix}_track_lengths[{P}_N_TRACKS] = {{'
+                + ', '.join(f'{t.var_name.upper()}_LENGTH' for t in bank.tracks) + '};\n')
+        f.write(f'static const uint32_t {prefix}_track_rates[{P}_N_TRACKS] = {{'
+                + ', '.join(f'{t.var_name.upper()}_RATE' for t in bank.tracks) + '};\n\n')
+
+        f.write(f'static inline int16_t {prefix}_sample(const uint16_t* blocks, uint32_t i) {{\n')
+        f.write(f'  uint16_t block = blocks[i >> {P}_BLOCK_SHIFT];\n')
+        f.write(f'  if (block == {P}_SILENT_BLOCK) return 0;\n')
+        f.write(f'  return {prefix}_block_pool[((uint32_t)block << {P}_BLOCK_SHIFT) | '
+                f'(i & ({P}_BLOCK_SAMPLES - 1))];\n')
+        f.write('}\n\n')
+        f.write(f'#endif // {guard}\n')
+
+def print_report(bank):
+    """Per-track block counts and the flash saved against plain int16 arrays."""
+    for t in bank.tracks:
+        print(f'  {t.name}: {len(t.blocks)} blocks, {t.n_silent} silent, {t.n_shared} shared')
+    verbatim, deduped = flash_bytes(bank)
+    index_bytes = sum(t.blocks.nbytes for t in bank.tracks)
+    saved = verbatim - deduped
+    print(f'  Pool: {len(bank.pool)} blocks of {bank.block_samples} samples ({bank.pool.nbytes:,} bytes), '
+          f'indexes {index_bytes:,} bytes')
+    print(f'  Flash: {verbatim:,} -> {deduped:,} bytes ({saved:+,} saved, {100 * saved / max(verbatim, 1):.1f}%)')
+    if saved <= 0:
+        print(f'  ⚠ Nothing to gain at {bank.block_samples}-sample blocks; the plain headers are smaller')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build a board\'s tracks into one deduplicated block bank.')
+    parser.add_argument('output', help='header to write (e.g. row1_rp2040/row_blocks.h)')
+    parser.add_argument('inputs', nargs='+', help='track headers or WAVs, or one rowN_rp2040 folder')
+    parser.add_argument('--block-samples', type=int, default=BLOCK_SAMPLES)
+    parser.add_argument('--silence-threshold', type=int, default=0,
+                        help='peak |sample| at or below which a block is stored as silence (lossy above 0)')
+    parser.add_argument('--fmt', choices=('text', 'hex', 'raw'), default='text')
+    parser.add_argument('--prefix', default='bank', help='prefix for the generated C names')
+    parser.add_argument('--dry-run', action='store_true', help='report the savings without writing')
+    args = parser.parse_args()
+
+    inputs = args.inputs
+    if len(inputs) == 1 and os.path.isdir(inputs[0]):
+        from render_mix import row_track_headers
+        output = os.path.abspath(args.output)
+        inputs = [h for h in row_track_headers(inputs[0]) if os.path.abspath(h) != output]
+
+    bank = dedup_tracks(inputs, args.block_samples, args.silence_threshold)
+    print(f'Deduplicated {len(bank.tracks)} tracks')
+    print_report(bank)
+    if not args.dry_run:
+        write_dedup_header(args.output, bank, args.fmt, args.prefix)
+        print(f'✓ Wrote {args.output}')
@@ -0,0 +1,200 @@
+import os
+import sys
+import io
+import json
+import time
+import wave
+import platform
+import argparse
+import tempfile
+import tracemalloc
+import contextlib
+from collections import namedtuple
+import numpy as np
+import scipy
+import conversion
+import conversion_compressed
+from compress_wav import compress_wav
+from trim_wav import trim_wav
+
+# (rate, channels, frames); prime frame counts catch FFT/resample sizes with no small factors
+Case = namedtuple('Case', ['rate', 'n_channels', 'n_frames'])
+
+QUICK_CORPUS = [
+    Case(44100, 2, 44100),
+    Case(22050, 1, 9973),
+]
+
+CORPUS = [
+    Case(rate, n_channels, int(rate * seconds))
+    for rate in (22050, 44100, 48000)
+    for n_channels in (1, 2)
+    for seconds in (1.0, 4.0, 20.0)
+] + [
+    Case(44100, 2, 104729),
+    Case(48000, 1, 1299709),
+    Case(11025, 1, 9973),
+]
+
+DEFAULT_THRESHOLD = 0.25  # fail compare when a stage gets 25% slower (or bigger)
+MIN_DELTA_SEC = 0.002     # ignore slowdowns smaller than timer/scheduler noise
+
+def case_name(case):
+    return f'{case.rate}Hz_{case.n_channels}ch_{case.n_frames}f'
+
+def make_signal(case, seed=0):
+    """Deterministic int16 test audio: a few partials, an envelope and some noise."""
+    rng = np.random.default_rng(seed + case.n_frames)
+    t = np.arange(case.n_frames) / case.rate
+    channels = []
+    for ch in range(case.n_channels):
+        tone = sum(np.sin(2 * np.pi * f * (1 + 0.01 * ch) * t) / (i + 1)
+                   for i, f in enumerate((110.0, 440.0, 1760.0, 5000.0)))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 2.0 * t) ** 2
+        channels.append(tone * envelope * 6000 + rng.normal(0, 300, case.n_frames))
+    samples = np.stack(channels, axis=1)
+    return np.clip(np.rint(samples), -32768, 32767).astype(np.int16)
+
+def write_case(case, corpus_dir):
+    """Write the case's WAV into corpus_dir and return its path."""
+    path = os.path.join(corpus_dir, case_name(case) + '.wav')
+    with wave.open(path, 'wb') as wav_out:
+        wav_out.setnchannels(case.n_channels)
+        wav_out.setsampwidth(2)
+        wav_out.setframerate(case.rate)
+        wav_out.writeframes(make_signal(case).astype('<i2').tobytes())
+    return path
+
+def _stages(case, wav_path, work_dir):
+    """(name, callable) for each stage that applies to case; each callable does one full run."""
+    out_dir = os.path.join(work_dir, 'out')
+    os.makedirs(out_dir, exist_ok=True)
+    with wave.open(wav_path, 'rb') as wav:
+        samples = np.frombuffer(wav.readframes(case.n_frames), dtype='<i2')
+    target_rate = 22050 if case.rate != 22050 else 16000
+
+    def in_dir(fn):
+        # conversion.convert_wav_to_header writes to the current directory
+        def run():
+            cwd = os.getcwd()
+            os.chdir(out_dir)
+            try:
+                fn()
+            finally:
+                os.chdir(cwd)
+        return run
+
+    stages = [
+        ('conversion.convert_wav_to_header',
+         in_dir(lambda: conversion.convert_wav_to_header(wav_path))),
+        ('conversion_compressed.convert_wav_to_header',
+         lambda: conversion_compressed.convert_wav_to_header(wav_path, output_dir=out_dir)),
+        ('conversion_compressed.convert_wav_to_header[stream]',
+         lambda: conversion_compressed.convert_wav_to_header(wav_path, output_dir=out_dir, stream=True)),
+        ('resample_audio',
+         lambda: conversion_compressed.resample_audio(samples, case.rate, target_rate, case.n_channels)),
+        ('compress_wav',
+         lambda: compress_wav(wav_path, os.path.join(out_dir, 'compressed.wav'))),
+        ('compress_wav[stream]',
+         lambda: compress_wav(wav_path, os.path.join(out_dir, 'compressed.wav'), stream=True)),
+        ('trim_wav',
+         lambda: trim_wav(wav_path, os.path.join(out_dir, 'trimmed.wav'))),
+    ]
+    if case.n_channels == 2:
+        stages.append(('convert_to_mono', lambda: conversion_compressed.convert_to_mono(samples)))
+    return stages
+
+def measure(fn, repeat):
+    """Best and median wall time over repeat runs, then one extra run under tracemalloc for the peak."""
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        tracemalloc.start()
+        try:
+            fn()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return min(times), float(np.median(times)), peak
+
+def run_benchmarks(corpus=CORPUS, repeat=3, stage_filter=None):
+    """
+    Time every stage on every corpus case.
+
+    Returns the results document written by --output: environment info plus
+    one record per (stage, case) with best/median seconds, peak traced bytes
+    and input samples per second.
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for case in corpus:
+            wav_path = write_case(case, work_dir)
+            n_samples = case.n_frames * case.n_channels
+            for stage, fn in _stages(case, wav_path, work_dir):
+                if stage_filter and not any(s in stage for s in stage_filter):
+                    continue
+                best, median, peak = measure(fn, repeat)
+                record = dict(stage=stage, case=case_name(case), samples=n_samples,
+                              seconds=best, median_seconds=median, peak_bytes=peak,
+                              samples_per_sec=n_samples / best if best else None)
+                results.append(record)
+                print(f'  {stage:52s} {case_name(case):24s} {best * 1000:9.1f} ms '
+                      f'{peak / 1024 / 1024:8.1f} MB')
+    return dict(
+        meta=dict(python=platform.python_version(), numpy=np.__version__, scipy=scipy.__version__,
+                  machine=platform.machine(), platform=platform.platform(), repeat=repeat,
+                  time=time.strftime('%Y-%m-%dT%H:%M:%S')),
+        results=results)
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD, memory_threshold=DEFAULT_THRESHOLD):
+    """
+    Compare two results documents.
+
+    Returns a list of (stage, case, metric, old, new) for every stage that got
+    slower than (1 + threshold) x baseline time (and by more than
+    MIN_DELTA_SEC), or used more than (1 + memory_threshold) x baseline peak memory.
+    """
+    old = {(r['stage'], r['case']): r for r in baseline['results']}
+    regressions = []
+    for r in current['results']:
+        base = old.get((r['stage'], r['case']))
+        if base is None:
+            continue
+        if r['seconds'] > base['seconds'] * (1 + threshold) and r['seconds'] - base['seconds'] > MIN_DELTA_SEC:
+            regressions.append((r['stage'], r['case'], 'seconds', base['seconds'], r['seconds']))
+        if memory_threshold is not None and r['peak_bytes'] > base['peak_bytes'] * (1 + memory_threshold):
+            regressions.append((r['stage'], r['case'], 'peak_bytes', base['peak_bytes'], r['peak_bytes']))
+    return regressions
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the conversion scripts on a synthetic WAV corpus.')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='where to write the JSON results')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per stage (best is kept)')
+    parser.add_argument('--quick', action='store_true', help='small corpus for a fast sanity run')
+    parser.add_argument('--stage', action='append', help='only stages whose name contains this (repeatable)')
+    parser.add_argument('--compare', metavar='BASELINE', help='fail if a stage regressed against this results file')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed slowdown as a fraction (0.25 = 25%%)')
+    parser.add_argument('--memory-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='allowed peak memory growth as a fraction')
+    args = parser.parse_args()
+
+    corpus = QUICK_CORPUS if args.quick else CORPUS
+    print(f'Benchmarking {len(corpus)} case(s), best of {args.repeat}...')
+    current = run_benchmarks(corpus, args.repeat, args.stage)
+    with open(args.output, 'w') as f:
+        json.dump(current, f, indent=1)
+    print(f'✓ Wrote {len(current["results"])} results to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current, args.threshold, args.memory_threshold)
+        for stage, case, metric, old, new in regressions:
+            print(f'✗ {stage} {case}: {metric} {old:.4g} -> {new:.4g} ({new / old - 1:+.0%})')
+        if regressions:
+            sys.exit(1)
+        print(f'✓ No regressions against {args.compare}')
@@ -0,0 +1,179 @@
+import os
+import io
+import json
+import time
+import shutil
+import hashlib
+import contextlib
+
+CACHE_DIR = '.audio_cache'
+MAX_CACHE_MB = 512
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """sha256 hex digest of a file's contents."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def hash_source(source, chunk_size=1024 * 1024):
+    """
+    Hash a WAV source (path or readable file-like object).
+
+    Seekable file-like sources (zip members included) are hashed in chunks
+    and rewound, so they are never held in memory whole; anything else is
+    read once into memory so the same bytes can be decoded afterwards.
+    Returns (digest, source) where source is the object to hand to the converter.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        return hash_file(source), source
+    h = hashlib.sha256()
+    if getattr(source, 'seekable', lambda: False)():
+        for chunk in iter(lambda: source.read(chunk_size), b''):
+            h.update(chunk)
+        source.seek(0)
+        return h.hexdigest(), source
+    data = source.read()
+    buffered = io.BytesIO(data)
+    buffered.name = getattr(source, 'name', 'input.wav')
+    h.update(data)
+    return h.hexdigest(), buffered
+
+class BuildCache:
+    """
+    Content-addressed cache of generated outputs.
+
+    Entries are keyed on the input bytes, the conversion parameters and the
+    converter version. Output files are stored under objects/<key>/ and
+    tracked in manifest.json, which also drives least-recently-used eviction
+    once the cache grows past max_size_mb.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_size_mb=MAX_CACHE_MB):
+        self.cache_dir = cache_dir
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.lock_path = os.path.join(cache_dir, 'manifest.lock')
+        os.makedirs(os.path.join(cache_dir, 'objects'), exist_ok=True)
+
+    @staticmethod
+    def make_key(source_digest, params, version):
+        """Cache key for a source digest, a JSON-serialisable params dict and a converter version."""
+        blob = json.dumps({'source': source_digest, 'params': params, 'version': version}, sort_keys=True)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    @contextlib.contextmanager
+    def _locked(self, timeout=30.0):
+        """Cross-process lock around manifest updates (batch workers share one cache)."""
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                fd = os.open(self.lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                break
+            except FileExistsError:
+                if time.monotonic() > deadline:
+                    # A crashed process left the lock behind
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(self.lock_path)
+                    deadline = time.monotonic() + timeout
+                    continue
+                time.sleep(0.01)
+        try:
+            yield
+        finally:
+            os.close(fd)
+            os.remove(self.lock_path)
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _save(self, manifest):
+        tmp_path = self.manifest_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.manifest_path)
+
+    def lookup(self, source, params, version, output_paths):
+        """
+        Hash source and try to satisfy output_paths from the cache.
+
+        Args:
+            source: WAV path or readable file-like object
+            params: JSON-serialisable dict of everything that affects the outputs
+            version: Converter version; bump it whenever the converter's output changes
+            output_paths: Files the conversion would produce
+
+        Returns:
+            (key, status, source): status is 'skipped', 'restored' or None on a
+            miss, and source is what the converter should read from (rewound,
+            or re-buffered when the stream cannot seek).
+        """
+        digest, source = hash_source(source)
+        key = self.make_key(digest, params, version)
+        return key, self.restore(key, output_paths), source
+
+    def restore(self, key, output_paths):
+        """
+        Make output_paths match the cached entry for key.
+
+        Outputs whose contents already match are left untouched; others are
+        copied back from the cache. Returns 'skipped', 'restored' or None on a miss.
+        """
+        with self._locked():
+            manifest = self._load()
+            entry = manifest.get(key)
+            if entry is None:
+                return None
+            names = [os.path.basename(p) for p in output_paths]
+            if sorted(names) != sorted(f['name'] for f in entry['files']):
+                return None
+            entry['last_used'] = time.time()
+            self._save(manifest)
+
+        digests = {f['name']: f['sha256'] for f in entry['files']}
+        status = 'skipped'
+        for path in output_paths:
+            name = os.path.basename(path)
+            if os.path.exists(path) and hash_file(path) == digests[name]:
+                continue
+            tmp_path = path + '.tmp'
+            try:
+                shutil.copyfile(os.path.join(self.cache_dir, 'objects', key, name), tmp_path)
+            except FileNotFoundError:
+                # Evicted by another process in the meantime
+                return None
+            os.replace(tmp_path, path)
+            status = 'restored'
+        return status
+
+    def store(self, key, output_paths):
+        """Copy freshly built output_paths into the cache under key, then evict if over budget."""
+        object_dir = os.path.join(self.cache_dir, 'objects', key)
+        os.makedirs(object_dir, exist_ok=True)
+        files = []
+        for path in output_paths:
+            name = os.path.basename(path)
+            shutil.copyfile(path, os.path.join(object_dir, name))
+            files.append({'name': name, 'sha256': hash_file(path), 'size': os.path.getsize(path)})
+
+        with self._locked():
+            manifest = self._load()
+            manifest[key] = {'files': files, 'size': sum(f['size'] for f in files), 'last_used': time.time()}
+            self._evict(manifest, keep=key)
+            self._save(manifest)
+
+    def _evict(self, manifest, keep=None):
+        """Drop least recently used entries until the cache fits max_bytes."""
+        total = sum(entry['size'] for entry in manifest.values())
+        for key in sorted(manifest, key=lambda k: manifest[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= manifest.pop(key)['size']
+            shutil.rmtree(os.path.join(self.cache_dir, 'objects', key), ignore_errors=True)
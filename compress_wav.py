@@ -2,74 +2,153 @@ import wave
 import sys
 import os
 import glob
-import numpy as np
-from scipy import signal
+from build_cache import BuildCache
+from streaming import stream_convert, stream_to_wav
+from pipeline_metrics import stage
+from wav_reader import open_wav
+from audio_stages import read_frames, downmix, resample, truncate
 
-def compress_wav(input_file, output_file=None, max_size_mb=0.23):
-    """Compress WAV file to max_size_mb with minimal quality loss."""
+# Bump whenever the compressed output changes for the same input and parameters
+COMPRESSOR_VERSION = 2
+
+def compress_wav(input_file, output_file=None, max_size_mb=0.23, cache=None, stream=False, metrics=None):
+    """
+    Compress WAV file to max_size_mb with minimal quality loss.
+    
+    input_file may be a path or a readable file-like object with a .name
+    (e.g. a member opened with zipfile.ZipFile.open), in any format
+    wav_reader handles; the output is always 16-bit. With a build_cache.BuildCache
+    passed as cache, unchanged inputs are skipped or restored from it.
+    stream=True reads, downmixes, resamples and writes in fixed-size blocks
+    so memory stays bounded for long recordings. A pipeline_metrics.PipelineMetrics
+    passed as metrics gets a timed record for each stage.
+    """
+    source_name = getattr(input_file, 'name', input_file)
     if output_file is None:
-        base = input_file.rsplit('.', 1)[0]
+        base = source_name.rsplit('.', 1)[0]
         output_file = f'{base}_compressed.wav'
     
     max_bytes = int(max_size_mb * 1024 * 1024)
     
-    with wave.open(input_file, 'rb') as wav_in:
+    if cache is not None:
+        cache_params = dict(max_size_mb=max_size_mb, stream=stream)
+        cache_key, status, input_file = cache.lookup(input_file, cache_params, COMPRESSOR_VERSION, [output_file])
+        if status is not None:
+            print(f"✓ Up to date ({status} from cache): {output_file}")
+            return output_file
+    
+    with open_wav(input_file) as wav_in:
         params = wav_in.getparams()
-        framerate, n_channels, sampwidth = params.framerate, params.nchannels, params.sampwidth
-        
-        if sampwidth != 2:
-            raise ValueError("Only 16-bit WAV files supported")
-        
-        frames = wav_in.readframes(params.nframes)
-        samples = np.frombuffer(frames, dtype=np.int16)
-        
-        # Convert stereo to mono (saves 50%)
-        if n_channels == 2:
-            samples = ((samples[::2].astype(np.int32) + samples[1::2]) // 2).astype(np.int16)
-            n_channels = 1
-            print(f"Converted to mono")
-        
-        # Calculate target sample rate to fit size
-        target_rate = framerate
-        max_samples = max_bytes // 2  # 16-bit = 2 bytes per sample
-        
-        if len(samples) > max_samples:
-            target_rate = int(framerate * max_samples / len(samples))
-            print(f"Target rate: {target_rate} Hz (from {framerate} Hz)")
-        
-        # Resample if needed
-        if target_rate < framerate:
-            num_samples = len(samples)
-            new_num = int(num_samples * target_rate / framerate)
-            samples = signal.resample(samples, new_num).astype(np.int16)
-            framerate = target_rate
-            print(f"Resampled to {framerate} Hz")
-        
-        # Truncate if still too large
-        if len(samples) * 2 > max_bytes:
-            samples = samples[:max_bytes // 2]
-            print(f"Truncated to {len(samples) / framerate:.2f} seconds")
+        framerate, n_channels = params.framerate, params.nchannels
         
-        # Write output
-        with wave.open(output_file, 'wb') as wav_out:
-            wav_out.setnchannels(n_channels)
-            wav_out.setsampwidth(2)
-            wav_out.setframerate(framerate)
-            wav_out.writeframes(samples.tobytes())
+        if stream:
+            n_samples, framerate, n_channels = _compress_streaming(wav_in, output_file, max_bytes,
+                                                                   metrics, source_name)
+        else:
+            # (frames, channels) int16 view of the frame bytes
+            with stage(metrics, 'read', file=source_name) as m:
+                samples = read_frames(wav_in)
+                m['bytes_in'] = samples.nbytes
+                m['samples_out'] = samples.size
+            
+            # Convert stereo to mono (saves 50%)
+            if n_channels == 2:
+                with stage(metrics, 'mono', file=source_name, samples_in=samples.size) as m:
+                    samples = downmix(samples)
+                    m['samples_out'] = len(samples)
+                n_channels = 1
+                print(f"Converted to mono")
+            
+            # Calculate target sample rate to fit size
+            with stage(metrics, 'size_estimate', file=source_name):
+                target_rate = framerate
+                max_samples = max_bytes // 2  # 16-bit = 2 bytes per sample
+                
+                if len(samples) > max_samples:
+                    target_rate = int(framerate * max_samples / len(samples))
+            if target_rate != framerate:
+                print(f"Target rate: {target_rate} Hz (from {framerate} Hz)")
+            
+            # Resample if needed
+            if target_rate < framerate:
+                with stage(metrics, 'resample', file=source_name, samples_in=len(samples),
+                           from_rate=framerate, to_rate=target_rate) as m:
+                    num_samples = len(samples)
+                    new_num = int(num_samples * target_rate / framerate)
+                    samples = resample(samples, framerate, target_rate, new_num)
+                    m['samples_out'] = len(samples)
+                framerate = target_rate
+                print(f"Resampled to {framerate} Hz")
+            
+            # Truncate if still too large
+            if len(samples) * 2 > max_bytes:
+                with stage(metrics, 'truncate', file=source_name, samples_in=len(samples)) as m:
+                    samples = truncate(samples, max_bytes // 2)
+                    m['samples_out'] = len(samples)
+                print(f"Truncated to {len(samples) / framerate:.2f} seconds")
+            
+            # Write output
+            with stage(metrics, 'emit', file=source_name, samples_in=len(samples)) as m:
+                with wave.open(output_file, 'wb') as wav_out:
+                    wav_out.setnchannels(n_channels)
+                    wav_out.setsampwidth(2)
+                    wav_out.setframerate(framerate)
+                    wav_out.writeframes(samples.tobytes())
+                m['bytes_out'] = os.path.getsize(output_file)
+            
+            n_samples = len(samples)
         
         size_mb = os.path.getsize(output_file) / 1024 / 1024
-        duration = len(samples) / framerate
-        print(f"✓ {input_file} -> {output_file}")
+        duration = n_samples / framerate
+        print(f"✓ {source_name} -> {output_file}")
         print(f"  Size: {size_mb:.2f} MB | Duration: {duration:.2f}s | Rate: {framerate} Hz | Channels: {n_channels}")
         
+        if cache is not None:
+            cache.store(cache_key, [output_file])
+        
         return output_file
 
+def _compress_streaming(wav_in, output_file, max_bytes, metrics=None, source_name=None):
+    """
+    Block-by-block version of compress_wav; returns (n_samples, framerate, n_channels).
+    
+    Reading, resampling and writing are interleaved, so metrics gets them as one 'stream' stage.
+    """
+    framerate, n_channels, n_frames = wav_in.getframerate(), wav_in.getnchannels(), wav_in.getnframes()
+    
+    mono = n_channels == 2
+    if mono:
+        n_channels = 1
+        print(f"Converting to mono (streaming)")
+    
+    # Same size rule as the in-memory path, worked out from the header's frame count
+    target_rate = framerate
+    max_frames = max_bytes // 2 // n_channels
+    if n_frames > max_frames:
+        target_rate = int(framerate * max_frames / n_frames)
+        print(f"Target rate: {target_rate} Hz (from {framerate} Hz)")
+    
+    if target_rate < framerate:
+        print(f"Resampling to {target_rate} Hz (streaming)")
+    else:
+        target_rate = framerate
+    
+    with stage(metrics, 'stream', file=source_name, samples_in=n_frames * wav_in.getnchannels(),
+               from_rate=framerate, to_rate=target_rate) as m:
+        blocks = stream_convert(wav_in, target_rate=target_rate, mono=mono)
+        n_frames_out = stream_to_wav(blocks, output_file, n_channels, target_rate, max_frames=max_frames)
+        m['samples_out'] = n_frames_out * n_channels
+        m['bytes_out'] = os.path.getsize(output_file)
+    return n_frames_out * n_channels, target_rate, n_channels
+
 if __name__ == '__main__':
+    cache = BuildCache()  # skip files whose input and settings haven't changed
+    
     if len(sys.argv) >= 2:
         # Process specific file(s) provided as arguments
         for wav_file in sys.argv[1:]:
             if os.path.exists(wav_file):
-                compress_wav(wav_file)
+                compress_wav(wav_file, cache=cache)
             else:
                 print(f"⚠ File not found: {wav_file}")
     else:
@@ -87,5 +166,5 @@ if __name__ == '__main__':
         
         print(f"Processing {len(wav_files)} file(s) in {data_dir}...\n")
         for wav_file in wav_files:
-            compress_wav(wav_file)
+            compress_wav(wav_file, cache=cache)
             print()
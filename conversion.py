@@ -1,7 +1,8 @@
-import wave
-import struct
 import sys
 import os
+from header_writer import write_sample_array
+from audio_stages import read_frames, interleave
+from wav_reader import open_wav
 
 # def convert_wav_to_header(wav_filename):
 #     base_name = os.path.splitext(os.path.basename(wav_filename))[0]
@@ -49,29 +50,29 @@ import os
 #         print(f'Converted {wav_filename} -> {header_filename}')
 #         print(f'  Variable: {var_name}_data[{len(samples)}]')
 
-def convert_wav_to_header(wav_filename):
-    """Convert a WAV file to a C header file with PROGMEM array."""
+def convert_wav_to_header(wav_filename, fmt='text'):
+    """
+    Convert a WAV file to a C header file with PROGMEM array.
+
+    wav_filename may be a path or a readable file-like object with a .name.
+    fmt selects the array encoding: 'text' (decimal), 'hex' or 'raw'
+    (samples in a companion .bin pulled in with #embed/.incbin).
+    """
 
     # Generate output filename
-    base_name = os.path.splitext(os.path.basename(wav_filename))[0]
+    source_name = getattr(wav_filename, 'name', wav_filename)
+    base_name = os.path.splitext(os.path.basename(source_name))[0]
     header_filename = f'{base_name}.h'
+    bin_filename = f'{base_name}.bin'
 
-    with wave.open(wav_filename, 'rb') as wav:
-        # Get WAV file properties
+    with open_wav(wav_filename) as wav:
+        # Get WAV file properties (any input format is read as 16-bit)
         n_channels = wav.getnchannels()
-        sample_width = wav.getsampwidth()
         framerate = wav.getframerate()
         n_frames = wav.getnframes()
 
-        # Verify it's 16-bit mono or stereo
-        if sample_width != 2:
-            raise ValueError(f'Unsupported sample width: {sample_width} bytes. Only 16-bit (2 bytes) is supported.')
-
-        # Read all frames
-        frames = wav.readframes(n_frames)
-
-        # Unpack as 16-bit signed integers
-        samples = struct.unpack(f'{len(frames)//2}h', frames)
+        # Read all frames as an int16 view of the frame bytes (interleaved)
+        samples = interleave(read_frames(wav, n_frames))
 
         # Generate header guard name
         guard_name = base_name.upper().replace('-', '_').replace(' ', '_') + '_H'
@@ -84,32 +85,21 @@ def convert_wav_to_header(wav_filename):
 
             # Write array declaration
             f.write(f'// Audio data: {n_frames} frames, {n_channels} channel(s), {framerate} Hz\n')
-            f.write('const int16_t audio_data[] PROGMEM = {\n')
+            write_sample_array(f, 'audio_data', samples, fmt, bin_filename)
 
-            # Write samples with formatting
-            for i, s in enumerate(samples):
-                f.write(f'{s:6d},')
-                if (i + 1) % 10 == 0:
-                    f.write('\n')
-                else:
-                    f.write(' ')
-
-            # Ensure newline if last line wasn't complete
-            if len(samples) % 10 != 0:
-                f.write('\n')
-
-            f.write('};\n\n')
             f.write(f'#define AUDIO_DATA_LENGTH {len(samples)}\n')
             f.write(f'#define AUDIO_SAMPLE_RATE {framerate}\n')
             f.write(f'#define AUDIO_N_CHANNELS {n_channels}\n\n')
             f.write(f'#endif // {guard_name}\n')
 
-        print(f'Successfully converted {wav_filename} to {header_filename}')
+        print(f'Successfully converted {source_name} to {header_filename}')
         print(f'  Samples: {len(samples)}, Channels: {n_channels}, Sample rate: {framerate} Hz')
 
 
 
 if __name__ == '__main__':
+    fmt = 'text'  # 'text', 'hex' or 'raw'
+
     if len(sys.argv) > 1:
         wav_file = sys.argv[1]
     else:
@@ -118,4 +108,4 @@ if __name__ == '__main__':
         # wav_file = 'Seventies-funk-drum-loop-109-BPM.wav'
         wav_file = 'Seventies-funk-drum-loop-109-BPM.wav'
 
-    convert_wav_to_header(wav_file)
\ No newline at end of file
+    convert_wav_to_header(wav_file, fmt=fmt)
\ No newline at end of file
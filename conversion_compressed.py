@@ -1,168 +1,323 @@
-import wave
-import struct
 import sys
 import os
+from collections import namedtuple
 import numpy as np
-from scipy import signal
+from header_writer import (write_sample_stream, write_byte_stream, estimate_array_bytes,
+                           estimate_byte_array_bytes, array_overhead_bytes, codec_tables_text)
+from sample_codecs import ENCODING_IDS, encoded_size, encode, decode, encode_stream, snr_db
+from build_cache import BuildCache
+from streaming import stream_convert
+from pipeline_metrics import stage
+from loop_trim import find_loop_cut, loop_cut_from_wav
+from wav_reader import open_wav, describe
+from audio_stages import read_frames, as_frames, interleave, downmix, resample, duration_frames
+
+# Bump whenever the generated headers change for the same input and parameters
+CONVERTER_VERSION = 5
+
+MIN_RATE = 8000  # Hz - lowest rate the size solver will go to before dropping channels or duration
+
+RateBudget = namedtuple('RateBudget', ['rate', 'n_channels', 'src_frames', 'out_frames'])
+
+def resampled_length(num_frames, original_rate, target_rate):
+    """Number of frames resample_audio produces for num_frames input frames."""
+    return num_frames * target_rate // original_rate
 
 def resample_audio(samples, original_rate, target_rate, n_channels):
-    """Resample audio data to target sample rate."""
-    samples_array = np.array(samples, dtype=np.int16)
+    """
+    Resample interleaved int16 audio to target_rate.
     
-    if n_channels == 2:
-        # Reshape stereo: [L, R, L, R, ...] -> [[L, L, ...], [R, R, ...]]
-        left = samples_array[::2]
-        right = samples_array[1::2]
-        
-        # Resample each channel
-        num_samples = len(left)
-        new_num_samples = int(num_samples * target_rate / original_rate)
-        
-        left_resampled = signal.resample(left, new_num_samples).astype(np.int16)
-        right_resampled = signal.resample(right, new_num_samples).astype(np.int16)
-        
-        # Interleave back: [L, R, L, R, ...]
-        resampled = np.empty(len(left_resampled) * 2, dtype=np.int16)
-        resampled[::2] = left_resampled
-        resampled[1::2] = right_resampled
-        
-        return resampled.tolist(), target_rate, 2
-    else:
-        # Mono: simple resample
-        num_samples = len(samples_array)
-        new_num_samples = int(num_samples * target_rate / original_rate)
-        resampled = signal.resample(samples_array, new_num_samples).astype(np.int16)
-        return resampled.tolist(), target_rate, 1
+    Returns (samples, target_rate, n_channels) with samples an interleaved int16 ndarray.
+    """
+    frames = as_frames(samples, n_channels)
+    resampled = resample(frames, original_rate, target_rate, resampled_length(len(frames), original_rate, target_rate))
+    return interleave(resampled), target_rate, n_channels
 
 def convert_to_mono(samples):
-    """Convert stereo samples to mono by averaging channels."""
-    samples_array = np.array(samples, dtype=np.int32)
-    mono = ((samples_array[::2] + samples_array[1::2]) // 2).astype(np.int16)
-    return mono.tolist()
+    """Convert interleaved stereo int16 samples to a mono int16 ndarray by averaging channels."""
+    return interleave(downmix(as_frames(samples, 2)))
 
-def estimate_header_size(num_samples, var_name):
-    """Estimate the size of the generated header file in bytes."""
-    # Header overhead: includes, defines, comments, etc.
-    overhead = 500
+def estimate_header_size(num_samples, var_name, fmt='text', encoding='pcm16', framerate=22050, n_channels=1):
+    """
+    Size of the header write_header produces for num_samples, in bytes
+    (header plus .bin for fmt='raw').
     
-    # Array declaration and formatting
-    # Each sample: " 12345," = ~7 bytes average
-    array_data = num_samples * 7
+    Exact: the text around the array is rendered with the same helpers
+    write_header uses, so the per-format boilerplate (e.g. the raw include,
+    which repeats the array name) is counted as written. The .bin name is
+    taken as var_name.bin, the same length as the converter's base_name.bin.
+    framerate only matters for its digit count; the solver passes the
+    target rate, which the solved rate never exceeds.
+    """
+    array_name = f'{var_name}_data'
+    if encoding == 'pcm16':
+        n_bytes = None
+        array_data = estimate_array_bytes(num_samples, fmt)
+        overhead = array_overhead_bytes(array_name, fmt, 'int16_t', f'{var_name}.bin')
+    else:
+        n_bytes = encoded_size(num_samples, encoding)
+        array_data = estimate_byte_array_bytes(n_bytes, fmt)
+        overhead = array_overhead_bytes(array_name, fmt, 'uint8_t', f'{var_name}.bin')
+    text = (_header_prologue(var_name, num_samples, n_channels, framerate, encoding)
+            + _header_epilogue(var_name, num_samples, n_channels, framerate, encoding, n_bytes))
+    return len(text.encode('utf-8')) + overhead + array_data
+
+def max_samples_for_budget(max_size_bytes, var_name, fmt='text', encoding='pcm16', framerate=22050, n_channels=1):
+    """Largest sample count whose estimated header size fits max_size_bytes."""
+    def size(n):
+        return estimate_header_size(n, var_name, fmt, encoding, framerate, n_channels)
     
-    # Define statements
-    defines = len(f'#define {var_name.upper()}_LENGTH {num_samples}\n') + \
-              len(f'#define {var_name.upper()}_RATE 22050\n') + \
-              len(f'#define {var_name.upper()}_CHANNELS 1\n')
+    per_sample = (size(10000) - size(0)) / 10000
+    n = max(0, int((max_size_bytes - size(0)) / per_sample))
+    # estimate_header_size is monotonic, so settle the rounding with a short walk
+    while n > 0 and size(n) > max_size_bytes:
+        n -= 1
+    while size(n + 1) <= max_size_bytes:
+        n += 1
+    return n
+
+def solve_rate_budget(n_frames, n_channels, framerate, max_size_bytes, var_name,
+                      target_rate=22050, fmt='text', min_rate=MIN_RATE, encoding='pcm16'):
+    """
+    Pick the output rate, channel count and duration that fit max_size_bytes.
+    
+    Preference order matches the old step-down loop: keep the channels and
+    lower the rate (never above target_rate) down to min_rate, then drop to
+    mono at the highest rate that fits, then keep min_rate mono and shorten
+    the clip. Everything is worked out from the source length, so the audio
+    only needs to be resampled once.
+    
+    Returns:
+        RateBudget(rate, n_channels, src_frames, out_frames) where src_frames
+        is how many source frames to keep before resampling.
+    """
+    max_samples = max_samples_for_budget(max_size_bytes, var_name, fmt, encoding, target_rate, n_channels)
     
-    return overhead + array_data + defines
+    if n_frames == 0:
+        return RateBudget(target_rate, n_channels, 0, 0)
+    
+    channel_options = [n_channels] if n_channels == 1 else [n_channels, 1]
+    for channels in channel_options:
+        max_frames = max_samples // channels
+        # Highest integer rate r with resampled_length(n_frames, framerate, r) <= max_frames
+        rate = min(target_rate, ((max_frames + 1) * framerate - 1) // n_frames)
+        while rate > 0 and resampled_length(n_frames, framerate, rate) > max_frames:
+            rate -= 1
+        if rate >= min(min_rate, target_rate):
+            return RateBudget(rate, channels, n_frames, resampled_length(n_frames, framerate, rate))
+    
+    # Even mono at the floor rate is too big: keep the floor rate and cut the duration
+    rate = min(min_rate, target_rate)
+    max_frames = max_samples
+    src_frames = min(n_frames, (max_frames + 1) * framerate // rate)
+    while src_frames > 0 and resampled_length(src_frames, framerate, rate) > max_frames:
+        src_frames -= 1
+    return RateBudget(rate, 1, src_frames, resampled_length(src_frames, framerate, rate))
 
-def convert_wav_to_header(wav_filename, max_size_mb=2.0, target_rate=22050, force_mono=False, max_duration_sec=None):
+def write_header(header_filename, var_name, blocks, n_samples, n_channels, framerate, fmt='text', bin_filename=None,
+                 encoding='pcm16', encoded=None):
+    """
+    Write the track header for var_name from an iterable of int16 sample blocks.
+    
+    n_samples goes into the leading comment; the _LENGTH define uses the count
+    actually written, which is returned. Encoded tracks ('mulaw', 'ima_adpcm')
+    are stored as a uint8_t array preceded by the decoder tables, with
+    _ENCODING and _BYTES defines alongside the usual ones. Callers that
+    already hold the encoded bytes of blocks pass them as encoded, and the
+    blocks are then only counted.
+    """
+    with open(header_filename, 'w') as f:
+        f.write(_header_prologue(var_name, n_samples, n_channels, framerate, encoding))
+        if encoding == 'pcm16':
+            n_bytes = None
+            written = write_sample_stream(f, f'{var_name}_data', blocks, fmt, bin_filename)
+        elif encoded is not None:
+            written = sum(np.size(block) for block in blocks)
+            n_bytes = write_byte_stream(f, f'{var_name}_data', [encoded], fmt, bin_filename)
+        else:
+            counted = []
+            def count_samples(blocks):
+                for block in blocks:
+                    counted.append(np.size(block))
+                    yield block
+            n_bytes = write_byte_stream(f, f'{var_name}_data', encode_stream(count_samples(blocks), encoding),
+                                        fmt, bin_filename)
+            written = sum(counted)
+        f.write(_header_epilogue(var_name, written, n_channels, framerate, encoding, n_bytes))
+    
+    return written
+
+def _header_prologue(var_name, n_samples, n_channels, framerate, encoding):
+    """Include guard, decoder tables and the leading comment, up to the sample array."""
+    guard_name = var_name.upper() + '_H'
+    text = f'#ifndef {guard_name}\n#define {guard_name}\n\n'
+    if encoding == 'pcm16':
+        return text + f'// {var_name}: {n_samples} samples, {n_channels} ch, {framerate} Hz\n'
+    return (text + codec_tables_text(encoding)
+            + f'// {var_name}: {n_samples} samples, {n_channels} ch, {framerate} Hz, {encoding}\n')
+
+def _header_epilogue(var_name, written, n_channels, framerate, encoding, n_bytes=None):
+    """Defines and the closing guard after the sample array."""
+    V = var_name.upper()
+    text = (f'#define {V}_LENGTH {written}\n'
+            f'#define {V}_RATE {framerate}\n'
+            f'#define {V}_CHANNELS {n_channels}\n')
+    if encoding != 'pcm16':
+        text += (f'#define {V}_ENCODING {ENCODING_IDS[encoding]}  // {encoding}\n'
+                 f'#define {V}_BYTES {n_bytes}\n')
+    return text + f'\n#endif // {V}_H\n'
+
+def convert_wav_to_header(wav_filename, max_size_mb=2.0, target_rate=22050, force_mono=False, max_duration_sec=None, fmt='text', output_dir=None, cache=None, stream=False, encoding='pcm16', plan=None, metrics=None, loop_trim=False):
     """
     Convert a WAV file to a C header file with size constraints.
     
     Args:
-        wav_filename: Input WAV file
+        wav_filename: Input WAV path, or a readable file-like object with a
+                      .name (e.g. from zipfile.ZipFile.open); 8/16/24/32-bit
+                      integer and float WAVs are read via wav_reader
         max_size_mb: Maximum output file size in MB (default 2.0)
         target_rate: Target sample rate in Hz (default 22050)
         force_mono: If True, convert stereo to mono (saves 50% space)
         max_duration_sec: Maximum duration in seconds (None = no limit)
+        fmt: Array encoding - 'text' (decimal), 'hex' or 'raw' (.bin blob
+             next to the header, included with #embed/.incbin by the one
+             source file that defines SAMPLE_DATA_IMPLEMENTATION)
+        output_dir: Directory for the generated files (None = current directory)
+        cache: Optional build_cache.BuildCache; unchanged inputs are skipped or
+               restored from it instead of being converted again
+        stream: If True, read, downmix, resample and emit in fixed-size blocks
+                so memory stays bounded for long recordings (zip members
+                too: they are read from the archive block by block)
+        encoding: Sample encoding - 'pcm16' (int16), 'mulaw' (8-bit) or
+                  'ima_adpcm' (4-bit, mono only); smaller encodings leave room
+                  for a higher rate within the same max_size_mb
+        plan: Optional RateBudget to use instead of solving one from
+              max_size_mb (flash_planner allocates these across a whole row)
+        metrics: Optional pipeline_metrics.PipelineMetrics that gets a timed
+                 record for each stage (read, truncate, mono, loop_trim,
+                 size_estimate, resample, emit)
+        loop_trim: If True, cut the loop to the largest whole number of bars
+                   (tempo from the file name or detected) that fits both
+                   max_duration_sec and the size budget, with the seam moved
+                   to a matching zero crossing; the solver then spends what
+                   is left of the budget on sample rate
     """
     max_size_bytes = max_size_mb * 1024 * 1024
     
-    base_name = os.path.splitext(os.path.basename(wav_filename))[0]
+    source_name = getattr(wav_filename, 'name', wav_filename)
+    base_name = os.path.splitext(os.path.basename(source_name))[0]
     var_name = base_name.replace('-', '_').replace(' ', '_').lower()
-    header_filename = f'{base_name}.h'
+    header_filename = os.path.join(output_dir or '', f'{base_name}.h')
+    bin_filename = os.path.join(output_dir or '', f'{base_name}.bin')
+    
+    print(f'Processing: {source_name}')
     
-    print(f'Processing: {wav_filename}')
+    output_paths = [header_filename, bin_filename] if fmt == 'raw' else [header_filename]
+    if cache is not None:
+        params = dict(base_name=base_name, max_size_mb=max_size_mb, target_rate=target_rate,
+                      force_mono=force_mono, max_duration_sec=max_duration_sec, fmt=fmt, stream=stream, encoding=encoding,
+                      plan=None if plan is None else tuple(plan), loop_trim=loop_trim)
+        cache_key, status, wav_filename = cache.lookup(wav_filename, params, CONVERTER_VERSION, output_paths)
+        if status is not None:
+            actual_size = sum(os.path.getsize(p) for p in output_paths)
+            print(f'✓ Up to date ({status} from cache): {header_filename} ({actual_size:,} bytes)')
+            return header_filename, actual_size
     
-    with wave.open(wav_filename, 'rb') as wav:
+    if encoding == 'ima_adpcm' and not force_mono:
+        print(f'  IMA-ADPCM is mono only, downmixing')
+        force_mono = True
+    
+    with open_wav(wav_filename) as wav:
         n_channels = wav.getnchannels()
-        sample_width = wav.getsampwidth()
         framerate = wav.getframerate()
         n_frames = wav.getnframes()
         
-        print(f'  Original: {n_frames} frames, {n_channels} ch, {framerate} Hz')
-        
-        if sample_width != 2:
-            raise ValueError(f'Unsupported sample width: {sample_width} bytes. Only 16-bit (2 bytes) is supported.')
-        
-        # Read all frames
-        frames = wav.readframes(n_frames)
-        samples = struct.unpack(f'{len(frames)//2}h', frames)
-        
-        # Truncate to max duration if specified
-        if max_duration_sec is not None:
-            max_samples = int(max_duration_sec * framerate * n_channels)
-            if len(samples) > max_samples:
-                original_duration = len(samples) / (framerate * n_channels)
-                samples = samples[:max_samples]
-                print(f'  Truncated from {original_duration:.2f}s to {max_duration_sec}s ({len(samples)} samples)')
-        
-        # Convert to mono if requested or if too large
-        if force_mono and n_channels == 2:
-            print(f'  Converting stereo to mono...')
-            samples = convert_to_mono(samples)
-            n_channels = 1
-            print(f'  After mono conversion: {len(samples)} samples')
-        
-        # Resample if needed
-        if framerate != target_rate:
-            print(f'  Resampling from {framerate} Hz to {target_rate} Hz...')
-            samples, framerate, n_channels = resample_audio(samples, framerate, target_rate, n_channels)
-            print(f'  After resampling: {len(samples)} samples')
-        
-        # Check size and reduce sample rate if needed
-        estimated_size = estimate_header_size(len(samples), var_name)
-        current_rate = framerate
-        
-        while estimated_size > max_size_bytes and current_rate > 8000:
-            # Reduce sample rate by 10%
-            current_rate = int(current_rate * 0.9)
-            print(f'  File too large ({estimated_size/1024/1024:.2f} MB), reducing rate to {current_rate} Hz...')
-            samples, framerate, n_channels = resample_audio(samples, framerate, current_rate, n_channels)
-            estimated_size = estimate_header_size(len(samples), var_name)
+        print(f'  Original: {n_frames} frames, {n_channels} ch, {framerate} Hz, {describe(wav.info)}')
         
-        if estimated_size > max_size_bytes:
-            # Last resort: convert to mono if stereo
-            if n_channels == 2:
-                print(f'  Still too large, converting to mono...')
-                samples = convert_to_mono(samples)
+        if stream:
+            n_samples, n_channels, framerate = _convert_streaming(
+                wav, header_filename, bin_filename, var_name, max_size_bytes, target_rate,
+                force_mono, max_duration_sec, fmt, encoding, plan, metrics, source_name, loop_trim)
+        else:
+            # Read all frames
+            # Zero-copy int16 view of the frame bytes, kept interleaved from here on
+            with stage(metrics, 'read', file=source_name) as m:
+                samples = interleave(read_frames(wav))
+                m['bytes_in'] = samples.nbytes
+                m['samples_out'] = len(samples)
+            
+            # Truncate to max duration if specified
+            if max_duration_sec is not None:
+                max_samples = duration_frames(max_duration_sec, framerate, n_channels) * n_channels
+                if len(samples) > max_samples:
+                    with stage(metrics, 'truncate', file=source_name, samples_in=len(samples)) as m:
+                        original_duration = len(samples) / (framerate * n_channels)
+                        samples = samples[:max_samples]
+                        m['samples_out'] = len(samples)
+                    print(f'  Truncated from {original_duration:.2f}s to {max_duration_sec}s ({len(samples)} samples)')
+            
+            # Convert to mono if requested or if too large
+            if force_mono and n_channels == 2:
+                print(f'  Converting stereo to mono...')
+                with stage(metrics, 'mono', file=source_name, samples_in=len(samples)) as m:
+                    samples = convert_to_mono(samples)
+                    m['samples_out'] = len(samples)
                 n_channels = 1
-                estimated_size = estimate_header_size(len(samples), var_name)
-        
-        # Generate header guard name
-        guard_name = var_name.upper() + '_H'
-        
-        # Write to header file
-        with open(header_filename, 'w') as f:
-            f.write(f'#ifndef {guard_name}\n')
-            f.write(f'#define {guard_name}\n\n')
+                print(f'  After mono conversion: {len(samples)} samples')
+            
+            if loop_trim:
+                fits = _loop_fits(n_channels, framerate, max_size_bytes, var_name, target_rate, fmt, encoding, plan)
+                with stage(metrics, 'loop_trim', file=source_name, samples_in=len(samples)) as m:
+                    cut = find_loop_cut(as_frames(samples, n_channels), framerate, base_name, fits)
+                    if cut is not None:
+                        samples = samples[:cut.frames * n_channels]
+                        plan = _trim_plan(plan, cut.frames, framerate)
+                    m['samples_out'] = len(samples)
+                _print_loop_cut(cut, framerate)
             
-            f.write(f'// {var_name}: {len(samples)} samples, {n_channels} ch, {framerate} Hz\n')
-            f.write(f'const int16_t {var_name}_data[] PROGMEM = {{\n')
+            # Solve for the rate/channels/duration that fit, then resample once from the source
+            with stage(metrics, 'size_estimate', file=source_name):
+                budget = plan or solve_rate_budget(len(samples) // n_channels, n_channels, framerate, max_size_bytes,
+                                                   var_name, target_rate=target_rate, fmt=fmt, encoding=encoding)
+            
+            if budget.n_channels < n_channels:
+                print(f'  Too large as stereo, converting to mono...')
+                with stage(metrics, 'mono', file=source_name, samples_in=len(samples)) as m:
+                    samples = convert_to_mono(samples)
+                    m['samples_out'] = len(samples)
+                n_channels = 1
             
-            for i, s in enumerate(samples):
-                f.write(f'{s:6d},')
-                if (i + 1) % 10 == 0:
-                    f.write('\n')
-                else:
-                    f.write(' ')
+            if budget.src_frames * n_channels < len(samples):
+                with stage(metrics, 'truncate', file=source_name, samples_in=len(samples)) as m:
+                    samples = samples[:budget.src_frames * n_channels]
+                    m['samples_out'] = len(samples)
+                print(f'  Too large even at {budget.rate} Hz mono, truncated to {budget.src_frames / framerate:.2f}s')
             
-            if len(samples) % 10 != 0:
-                f.write('\n')
+            if budget.rate != framerate:
+                print(f'  Resampling from {framerate} Hz to {budget.rate} Hz...')
+                with stage(metrics, 'resample', file=source_name, samples_in=len(samples),
+                           from_rate=framerate, to_rate=budget.rate) as m:
+                    samples, framerate, n_channels = resample_audio(samples, framerate, budget.rate, n_channels)
+                    m['samples_out'] = len(samples)
+                print(f'  After resampling: {len(samples)} samples')
             
-            f.write('};\n\n')
-            f.write(f'#define {var_name.upper()}_LENGTH {len(samples)}\n')
-            f.write(f'#define {var_name.upper()}_RATE {framerate}\n')
-            f.write(f'#define {var_name.upper()}_CHANNELS {n_channels}\n\n')
-            f.write(f'#endif // {guard_name}\n')
+            with stage(metrics, 'emit', file=source_name, samples_in=len(samples), fmt=fmt, encoding=encoding) as m:
+                encoded = None if encoding == 'pcm16' else encode(samples, encoding)
+                n_samples = write_header(header_filename, var_name, [samples], len(samples),
+                                         n_channels, framerate, fmt, bin_filename, encoding, encoded)
+                m['bytes_out'] = sum(os.path.getsize(p) for p in output_paths)
+            
+            if encoded is not None:
+                # The bytes just written, so the track is encoded only once
+                decoded = decode(encoded, encoding, len(samples))
+                print(f'  {encoding} round-trip SNR: {snr_db(samples, decoded):.1f} dB')
         
         # Check actual file size
-        actual_size = os.path.getsize(header_filename)
+        actual_size = sum(os.path.getsize(p) for p in output_paths)
         size_mb = actual_size / 1024 / 1024
         
-        print(f'✓ Converted {wav_filename} -> {header_filename}')
-        print(f'  Final: {len(samples)} samples, {n_channels} ch, {framerate} Hz')
+        print(f'✓ Converted {source_name} -> {header_filename}')
+        print(f'  Final: {n_samples} samples, {n_channels} ch, {framerate} Hz')
         print(f'  File size: {size_mb:.2f} MB ({actual_size:,} bytes)')
         
         if actual_size > max_size_bytes:
@@ -170,13 +325,93 @@ def convert_wav_to_header(wav_filename, max_size_mb=2.0, target_rate=22050, forc
         else:
             print(f'  ✓ File size OK (under {max_size_mb} MB limit)')
         
+        if cache is not None:
+            cache.store(cache_key, output_paths)
+        
         return header_filename, actual_size
 
+def _loop_fits(n_channels, framerate, max_size_bytes, var_name, target_rate, fmt, encoding, plan):
+    """Budget check for loop trimming: whether n source frames fit without being cut short."""
+    if plan is not None:
+        return lambda n: n <= plan.src_frames
+    return lambda n: solve_rate_budget(n, n_channels, framerate, max_size_bytes, var_name, target_rate=target_rate,
+                                       fmt=fmt, encoding=encoding).src_frames == n
+
+def _trim_plan(plan, src_frames, framerate):
+    """Shorten a given RateBudget to a loop cut (no-op without a plan)."""
+    if plan is None or src_frames >= plan.src_frames:
+        return plan
+    return plan._replace(src_frames=src_frames, out_frames=resampled_length(src_frames, framerate, plan.rate))
+
+def _print_loop_cut(cut, framerate):
+    if cut is None:
+        print(f'  ⚠ No tempo found, keeping the time-based cut')
+    else:
+        print(f'  Loop trimmed to {cut.count} {cut.unit} at {cut.bpm:.1f} BPM ({cut.bpm_source}): '
+              f'{cut.frames / framerate:.3f}s')
+
+def _convert_streaming(wav, header_filename, bin_filename, var_name, max_size_bytes, target_rate,
+                       force_mono, max_duration_sec, fmt, encoding='pcm16', plan=None, metrics=None,
+                       source_name=None, loop_trim=False):
+    """
+    Block-by-block version of the conversion in convert_wav_to_header.
+    
+    The size budget is solved from the frame count in the WAV header, so only
+    the frames that will be kept are ever read. Returns (n_samples, n_channels, framerate).
+    Reading, resampling and formatting are interleaved block by block, so
+    metrics gets them as a single 'stream' stage after 'size_estimate'.
+    """
+    n_channels = wav.getnchannels()
+    framerate = wav.getframerate()
+    n_frames = wav.getnframes()
+    
+    if max_duration_sec is not None:
+        max_frames = duration_frames(max_duration_sec, framerate, n_channels)
+        if n_frames > max_frames:
+            print(f'  Truncating from {n_frames / framerate:.2f}s to {max_duration_sec}s ({max_frames} frames)')
+            n_frames = max_frames
+    
+    channels = 1 if force_mono else n_channels
+    if loop_trim:
+        fits = _loop_fits(channels, framerate, max_size_bytes, var_name, target_rate, fmt, encoding, plan)
+        with stage(metrics, 'loop_trim', file=source_name, samples_in=n_frames * n_channels) as m:
+            base_name = os.path.splitext(os.path.basename(header_filename))[0]
+            cut = loop_cut_from_wav(wav, n_frames, base_name, fits)
+            if cut is not None:
+                n_frames = cut.frames
+                plan = _trim_plan(plan, cut.frames, framerate)
+            m['samples_out'] = n_frames * n_channels
+        _print_loop_cut(cut, framerate)
+    
+    with stage(metrics, 'size_estimate', file=source_name):
+        budget = plan or solve_rate_budget(n_frames, channels, framerate, max_size_bytes,
+                                           var_name, target_rate=target_rate, fmt=fmt, encoding=encoding)
+    
+    if budget.n_channels < n_channels:
+        print(f'  Converting stereo to mono...')
+    if budget.src_frames < n_frames:
+        print(f'  Too large even at {budget.rate} Hz mono, truncating to {budget.src_frames / framerate:.2f}s')
+    if budget.rate != framerate:
+        print(f'  Resampling from {framerate} Hz to {budget.rate} Hz (streaming)...')
+    
+    with stage(metrics, 'stream', file=source_name, samples_in=budget.src_frames * n_channels,
+               from_rate=framerate, to_rate=budget.rate, fmt=fmt, encoding=encoding) as m:
+        blocks = stream_convert(wav, target_rate=budget.rate, mono=budget.n_channels < n_channels,
+                                max_frames=budget.src_frames)
+        n_samples = write_header(header_filename, var_name, blocks, budget.out_frames * budget.n_channels,
+                                 budget.n_channels, budget.rate, fmt, bin_filename, encoding)
+        m['samples_out'] = n_samples
+        m['bytes_out'] = os.path.getsize(header_filename) + (os.path.getsize(bin_filename) if fmt == 'raw' else 0)
+    return n_samples, budget.n_channels, budget.rate
+
 if __name__ == '__main__':
     max_size = 2.0  # MB
     target_rate = 22050  # Hz
     force_mono = False  # Set to True to force mono conversion
     max_duration = 4.0  # seconds - truncate audio to max 4 seconds
+    fmt = 'text'  # 'text', 'hex' or 'raw' (.bin + #embed/.incbin)
+    encoding = 'pcm16'  # 'pcm16', 'mulaw' or 'ima_adpcm'
+    cache = BuildCache()  # skip tracks whose WAV and settings haven't changed
     
     if len(sys.argv) > 1:
         wav_files = sys.argv[1:]
@@ -193,7 +428,8 @@ if __name__ == '__main__':
         if os.path.exists(wav_file):
             _, size = convert_wav_to_header(wav_file, max_size_mb=max_size, 
                                            target_rate=target_rate, force_mono=force_mono,
-                                           max_duration_sec=max_duration)
+                                           max_duration_sec=max_duration, fmt=fmt, cache=cache,
+                                           encoding=encoding)
             total_size += size
             print()
         else:
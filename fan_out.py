@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import wave
+import hashlib
+import argparse
+import numpy as np
+from conversion_compressed import solve_rate_budget, resampled_length, write_header, RateBudget
+from sample_codecs import ENCODINGS
+from audio_stages import duration_frames, truncate, downmix, resample, interleave
+from loop_trim import find_loop_cut
+from wav_reader import open_wav, describe
+from pipeline_metrics import stage
+from build_cache import BuildCache
+
+# Bump whenever any of the outputs change for the same input and parameters
+FAN_OUT_VERSION = 3
+
+OUTPUTS = ('trimmed', 'compressed', 'header', 'raw', 'meta')
+
+def output_paths(base_name, outputs, output_dir=None, fmt='text'):
+    """{output: path} with the names the single-purpose scripts use."""
+    names = {
+        'trimmed': f'{base_name}_trimmed.wav',      # trim_wav.py
+        'compressed': f'{base_name}_compressed.wav',  # compress_wav.py
+        'header': f'{base_name}.h',                 # conversion_compressed.py
+        'raw': f'{base_name}.pcm',                  # headerless int16 for LittleFS
+        'meta': f'{base_name}.json',
+    }
+    paths = {out: os.path.join(output_dir or '', names[out]) for out in OUTPUTS if out in outputs}
+    if 'header' in outputs and fmt == 'raw':
+        paths['header_bin'] = os.path.join(output_dir or '', f'{base_name}.bin')
+    return paths
+
+def plan_processing(n_frames, n_channels, framerate, outputs, var_name, header_max_bytes, compressed_max_bytes,
+                    target_rate=22050, force_mono=False, fmt='text', encoding='pcm16'):
+    """
+    One RateBudget that satisfies every requested processed output.
+
+    The header's budget comes from solve_rate_budget; the compressed WAV's
+    from compress_wav's rule (mono, rate scaled down until the samples fit,
+    then truncated). The shared plan takes the lowest rate, channel count and
+    source length of the two, so a single resample feeds both and they agree
+    on rate and length. Returns None when neither is requested.
+    """
+    channels = 1 if force_mono or encoding == 'ima_adpcm' or 'compressed' in outputs else n_channels
+    budgets = []
+    if 'header' in outputs:
+        budgets.append(solve_rate_budget(n_frames, channels, framerate, header_max_bytes, var_name,
+                                         target_rate=target_rate, fmt=fmt, encoding=encoding))
+    if 'compressed' in outputs:
+        max_frames = compressed_max_bytes // 2
+        rate = framerate if n_frames <= max_frames else int(framerate * max_frames / n_frames)
+        src_frames = n_frames
+        while src_frames > 0 and resampled_length(src_frames, framerate, rate) > max_frames:
+            src_frames = min(src_frames - 1, max_frames * framerate // rate)
+        budgets.append(RateBudget(rate, 1, src_frames, resampled_length(src_frames, framerate, rate)))
+    if not budgets:
+        return None
+    rate = min(b.rate for b in budgets)
+    src_frames = min(b.src_frames for b in budgets)
+    return RateBudget(rate, min(b.n_channels for b in budgets), src_frames,
+                      resampled_length(src_frames, framerate, rate))
+
+def _write_wav(path, frames, framerate):
+    with wave.open(path, 'wb') as wav_out:
+        wav_out.setnchannels(frames.shape[1])
+        wav_out.setsampwidth(2)
+        wav_out.setframerate(framerate)
+        wav_out.writeframes(np.ascontiguousarray(frames, dtype='<i2').tobytes())
+
+def _sha256(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def fan_out(wav_filename, outputs=OUTPUTS, output_dir=None, max_seconds=4.0, bars=False, header_max_mb=2.0,
+            compressed_max_mb=0.23, target_rate=22050, force_mono=False, fmt='text', encoding='pcm16',
+            cache=None, metrics=None):
+    """
+    Decode a WAV once and write any set of outputs from the same samples.
+
+    Args:
+        wav_filename: Input WAV path or readable file-like object with a .name
+        outputs: Any of OUTPUTS:
+                 'trimmed'    - the cut at the source rate, as trim_wav writes it
+                 'compressed' - mono WAV within compressed_max_mb, as compress_wav
+                 'header'     - C header within header_max_mb, as conversion_compressed
+                 'raw'        - the trimmed cut as headerless int16 (.pcm), so the
+                                LittleFS player can read from byte 0
+                 'meta'       - JSON with the cut, the processing plan and every
+                                output's size and sha256
+        output_dir: Directory for the outputs (None = current directory)
+        max_seconds: Cut length (None = whole file)
+        bars: Cut to whole bars within max_seconds instead (see loop_trim)
+        header_max_mb, compressed_max_mb: Size budgets of the processed outputs
+        target_rate, force_mono, fmt, encoding: As for convert_wav_to_header
+        cache: Optional BuildCache; skips or restores all outputs together
+        metrics: Optional PipelineMetrics; stages read, trim, mono, resample, emit
+
+    The processed outputs (compressed WAV and header) share one plan from
+    plan_processing, so the source is downmixed and resampled once for both.
+    Returns {output: path}.
+    """
+    unknown = set(outputs) - set(OUTPUTS)
+    if unknown:
+        raise ValueError(f'Unknown output(s): {", ".join(sorted(unknown))}')
+    source_name = getattr(wav_filename, 'name', wav_filename)
+    base_name = os.path.splitext(os.path.basename(source_name))[0]
+    var_name = base_name.replace('-', '_').replace(' ', '_').lower()
+    paths = output_paths(base_name, outputs, output_dir, fmt)
+
+    print(f'Processing: {source_name}')
+    if cache is not None:
+        params = dict(base_name=base_name, outputs=sorted(outputs), max_seconds=max_seconds, bars=bars,
+                      header_max_mb=header_max_mb, compressed_max_mb=compressed_max_mb, target_rate=target_rate,
+                      force_mono=force_mono, fmt=fmt, encoding=encoding)
+        cache_key, status, wav_filename = cache.lookup(wav_filename, params, FAN_OUT_VERSION, list(paths.values()))
+        if status is not None:
+            print(f'✓ Up to date ({status} from cache): {", ".join(paths.values())}')
+            return paths
+
+    with open_wav(wav_filename) as wav:
+        framerate, n_channels = wav.getframerate(), wav.getnchannels()
+        source_format = describe(wav.info)
+        n_frames = wav.getnframes()
+        if max_seconds is not None:
+            n_frames = min(n_frames, duration_frames(max_seconds, framerate, n_channels))
+        with stage(metrics, 'read', file=source_name) as m:
+            frames = wav.frames(0, n_frames)
+            m['samples_out'] = frames.size
+    print(f'  Source: {wav.info.n_frames} frames, {n_channels} ch, {framerate} Hz, {source_format}')
+
+    cut = None
+    if bars:
+        with stage(metrics, 'trim', file=source_name, samples_in=frames.size) as m:
+            cut = find_loop_cut(frames, framerate, base_name)
+            if cut is not None:
+                frames = truncate(frames, cut.frames)
+            m['samples_out'] = frames.size
+        if cut is None:
+            print(f'  ⚠ No tempo found, keeping the {max_seconds}s cut')
+        else:
+            print(f'  Cut to {cut.count} {cut.unit} at {cut.bpm:.1f} BPM ({cut.bpm_source})')
+    print(f'  Cut: {len(frames)} frames ({len(frames) / framerate:.2f}s)')
+
+    plan = plan_processing(len(frames), n_channels, framerate, outputs, var_name, header_max_mb * 1024 * 1024,
+                           int(compressed_max_mb * 1024 * 1024), target_rate, force_mono, fmt, encoding)
+    processed = None
+    if plan is not None:
+        processed = truncate(frames, plan.src_frames)
+        if plan.n_channels < n_channels:
+            with stage(metrics, 'mono', file=source_name, samples_in=processed.size) as m:
+                processed = downmix(processed)
+                m['samples_out'] = processed.size
+        if plan.rate != framerate:
+            with stage(metrics, 'resample', file=source_name, samples_in=processed.size,
+                       from_rate=framerate, to_rate=plan.rate) as m:
+                processed = resample(processed, framerate, plan.rate, plan.out_frames)
+                m['samples_out'] = processed.size
+        print(f'  Processed once: {len(processed)} frames, {plan.n_channels} ch, {plan.rate} Hz')
+
+    with stage(metrics, 'emit', file=source_name, outputs=sorted(outputs)) as m:
+        if 'trimmed' in paths:
+            _write_wav(paths['trimmed'], frames, framerate)
+        if 'raw' in paths:
+            with open(paths['raw'], 'wb') as f:
+                f.write(np.ascontiguousarray(frames, dtype='<i2').tobytes())
+        if 'compressed' in paths:
+            _write_wav(paths['compressed'], processed, plan.rate)
+        if 'header' in paths:
+            write_header(paths['header'], var_name, [interleave(processed)], processed.size, plan.n_channels,
+                         plan.rate, fmt, paths.get('header_bin'), encoding)
+        if 'meta' in paths:
+            meta = dict(source=dict(name=os.path.basename(source_name), format=source_format, rate=framerate,
+                                    channels=n_channels),
+                        cut=dict(frames=len(frames), seconds=len(frames) / framerate,
+                                 bars=None if cut is None else dict(count=cut.count, unit=cut.unit, bpm=cut.bpm,
+                                                                    bpm_source=cut.bpm_source)),
+                        processed=None if plan is None else dict(rate=plan.rate, channels=plan.n_channels,
+                                                                 frames=len(processed), encoding=encoding, fmt=fmt),
+                        outputs={out: dict(file=os.path.basename(path), bytes=os.path.getsize(path),
+                                           sha256=_sha256(path))
+                                 for out, path in paths.items() if out != 'meta'})
+            with open(paths['meta'], 'w') as f:
+                json.dump(meta, f, indent=2)
+        m['bytes_out'] = sum(os.path.getsize(p) for p in paths.values())
+
+    for out, path in paths.items():
+        print(f'✓ {out}: {path} ({os.path.getsize(path):,} bytes)')
+    if 'header' in paths and os.path.getsize(paths['header']) > header_max_mb * 1024 * 1024:
+        print(f'  ⚠ WARNING: header exceeds {header_max_mb} MB')
+
+    if cache is not None:
+        cache.store(cache_key, list(paths.values()))
+    return paths
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Decode each WAV once and write trimmed/compressed WAVs, '
+                                                 'header, raw PCM and metadata from the same samples.')
+    parser.add_argument('wav_files', nargs='+')
+    parser.add_argument('--outputs', nargs='+', choices=OUTPUTS, default=list(OUTPUTS))
+    parser.add_argument('-o', '--output-dir', default=None)
+    parser.add_argument('--max-seconds', type=float, default=4.0, help='cut length, 0 for the whole file')
+    parser.add_argument('--bars', action='store_true', help='cut to whole bars within --max-seconds')
+    parser.add_argument('--header-mb', type=float, default=2.0)
+    parser.add_argument('--compressed-mb', type=float, default=0.23)
+    parser.add_argument('--target-rate', type=int, default=22050)
+    parser.add_argument('--mono', action='store_true')
+    parser.add_argument('--fmt', choices=('text', 'hex', 'raw'), default='text')
+    parser.add_argument('--encoding', choices=ENCODINGS, default='pcm16')
+    args = parser.parse_args()
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    cache = BuildCache()
+    failed = []
+    for wav_file in args.wav_files:
+        try:
+            fan_out(wav_file, args.outputs, args.output_dir, args.max_seconds or None, args.bars, args.header_mb,
+                    args.compressed_mb, args.target_rate, args.mono, args.fmt, args.encoding, cache)
+        except (OSError, ValueError) as e:
+            print(f'✗ {wav_file}: {e}')
+            failed.append(wav_file)
+        print()
+    if failed:
+        sys.exit(1)
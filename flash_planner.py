@@ -0,0 +1,198 @@
+import os
+import argparse
+from collections import namedtuple
+from conversion_compressed import (convert_wav_to_header, estimate_header_size, resampled_length,
+                                   RateBudget, MIN_RATE)
+from build_cache import BuildCache
+from wav_reader import open_wav
+from audio_stages import duration_frames
+
+ROW_BUDGET_MB = 2.0  # total for the four track headers of a rowN_rp2040 board
+
+# priority scales a track's share of the rate (2.0 = twice the rate of a 1.0 track,
+# up to the target); min_rate is where it stops giving up rate for the others
+TrackSpec = namedtuple('TrackSpec', ['path', 'priority', 'min_rate'], defaults=(1.0, MIN_RATE))
+
+TrackPlan = namedtuple('TrackPlan', ['spec', 'var_name', 'source_rate', 'budget', 'size_bytes'])
+
+def probe_track(wav_filename, max_duration_sec=None):
+    """Frame count (after the max_duration_sec cut), channels and rate from the WAV header."""
+    with open_wav(wav_filename) as wav:
+        n_channels = wav.getnchannels()
+        framerate = wav.getframerate()
+        n_frames = wav.getnframes()
+    if max_duration_sec is not None:
+        # Same cut as convert_wav_to_header
+        n_frames = min(n_frames, duration_frames(max_duration_sec, framerate, n_channels))
+    return n_frames, n_channels, framerate
+
+def _frames_for_output(n_frames, framerate, rate, max_out):
+    """Most source frames (up to n_frames) that resample to at most max_out frames."""
+    return max(0, min(n_frames, ((max_out + 1) * framerate - 1) // rate))
+
+def plan_row(specs, budget_bytes, target_rate=22050, force_mono=False, max_duration_sec=None,
+             fmt='text', encoding='pcm16'):
+    """
+    Allocate rate, channels and duration across all tracks of a board so the
+    headers fit budget_bytes together.
+
+    Every track's rate follows one shared level, level * priority, clamped
+    between its min_rate and the target (never above the source rate, which
+    would only spend flash on upsampling). The level is the highest that fits.
+    The fallbacks follow solve_rate_budget, but for the whole row at once:
+    lower the level, then make every track mono, then keep the floor rates and
+    cap every track at a length proportional to its priority.
+
+    Returns:
+        List of TrackPlan, one per spec, in order. budget is the RateBudget to
+        hand to convert_wav_to_header(plan=...), size_bytes its estimated header size.
+    """
+    tracks = []
+    for spec in specs:
+        n_frames, n_channels, framerate = probe_track(spec.path, max_duration_sec)
+        if force_mono or encoding == 'ima_adpcm':
+            n_channels = 1
+        base_name = os.path.splitext(os.path.basename(spec.path))[0]
+        var_name = base_name.replace('-', '_').replace(' ', '_').lower()
+        tracks.append((spec, var_name, n_frames, n_channels, framerate))
+
+    def size(var_name, budget):
+        return estimate_header_size(budget.out_frames * budget.n_channels, var_name, fmt, encoding, budget.rate,
+                                    budget.n_channels)
+
+    def make_plans(budgets):
+        return [TrackPlan(spec, var_name, framerate, budget, size(var_name, budget))
+                for (spec, var_name, _, _, framerate), budget in zip(tracks, budgets)]
+
+    def at_level(level, mono):
+        budgets = []
+        for spec, _, n_frames, n_channels, framerate in tracks:
+            ceiling = min(target_rate, framerate)
+            rate = int(min(ceiling, max(spec.min_rate, level * spec.priority)))
+            channels = 1 if mono else n_channels
+            budgets.append(RateBudget(rate, channels, n_frames, resampled_length(n_frames, framerate, rate)))
+        return budgets
+
+    def total(budgets):
+        return sum(size(var_name, b) for (_, var_name, _, _, _), b in zip(tracks, budgets))
+
+    def highest_fitting(fits, hi):
+        """Largest integer x in [0, hi] with fits(x), given fits is monotonic and fits(0)."""
+        lo = 0
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if fits(mid):
+                lo = mid
+            else:
+                hi = mid - 1
+        return lo
+
+    if not tracks:
+        return []
+
+    top_level = max(min(target_rate, t[4]) / t[0].priority for t in tracks)
+    for mono in (False, True):
+        if total(at_level(0, mono)) <= budget_bytes:
+            level = highest_fitting(lambda x: total(at_level(x, mono)) <= budget_bytes, int(top_level) + 1)
+            return make_plans(at_level(level, mono))
+
+    # Even every track mono at its floor rate is too big: cap each track's
+    # length at cap * priority output samples and find the largest cap that fits
+    floor = at_level(0, True)
+
+    def truncated(cap):
+        budgets = []
+        for (spec, _, n_frames, _, framerate), b in zip(tracks, floor):
+            max_out = min(b.out_frames, int(cap * spec.priority))
+            src_frames = _frames_for_output(n_frames, framerate, b.rate, max_out)
+            budgets.append(RateBudget(b.rate, 1, src_frames, resampled_length(src_frames, framerate, b.rate)))
+        return budgets
+
+    longest = max(b.out_frames / t[0].priority for t, b in zip(tracks, floor))
+    cap = highest_fitting(lambda x: total(truncated(x)) <= budget_bytes, int(longest) + 1)
+    return make_plans(truncated(cap))
+
+def print_plan(plans, budget_bytes):
+    """Print the per-track allocation and the row total."""
+    for p in plans:
+        b = p.budget
+        print(f'  {os.path.basename(p.spec.path)}: {b.rate} Hz, {b.n_channels} ch, '
+              f'{b.src_frames / p.source_rate:.2f}s, ~{p.size_bytes:,} bytes (priority {p.spec.priority:g})')
+    planned = sum(p.size_bytes for p in plans)
+    print(f'  Planned total: {planned:,} of {int(budget_bytes):,} bytes')
+
+def build_row(specs, budget_mb=ROW_BUDGET_MB, target_rate=22050, force_mono=False, max_duration_sec=4.0,
+              fmt='text', output_dir=None, cache=None, stream=False, encoding='pcm16'):
+    """
+    Plan a row's tracks against one flash budget and convert them all in one pass.
+
+    Returns:
+        (plans, results) with results a list of (header_filename, size) like
+        convert_wav_to_header returns.
+    """
+    budget_bytes = budget_mb * 1024 * 1024
+    plans = plan_row(specs, budget_bytes, target_rate, force_mono, max_duration_sec, fmt, encoding)
+    print(f'Row plan ({len(plans)} tracks, {budget_mb} MB):')
+    print_plan(plans, budget_bytes)
+    print()
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    results = []
+    for p in plans:
+        results.append(convert_wav_to_header(p.spec.path, max_size_mb=p.size_bytes / 1024 / 1024,
+                                             target_rate=target_rate, force_mono=force_mono,
+                                             max_duration_sec=max_duration_sec, fmt=fmt, output_dir=output_dir,
+                                             cache=cache, stream=stream, encoding=encoding, plan=p.budget))
+        print()
+
+    total_size = sum(size for _, size in results)
+    if total_size > budget_bytes:
+        print(f'⚠ Row total {total_size:,} bytes exceeds {budget_mb} MB')
+    else:
+        print(f'✓ Row total {total_size:,} bytes ({total_size / budget_bytes:.0%} of {budget_mb} MB)')
+    return plans, results
+
+def _parse_overrides(items, convert):
+    """Turn ['name=value', ...] into {name: value}."""
+    overrides = {}
+    for item in items or []:
+        name, _, value = item.rpartition('=')
+        if not name:
+            raise ValueError(f'Expected NAME=VALUE, got {item!r}')
+        overrides[name] = convert(value)
+    return overrides
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fit all tracks of a board into one flash budget.')
+    parser.add_argument('wav_files', nargs='+', help='the row\'s WAVs, in track order')
+    parser.add_argument('--budget-mb', type=float, default=ROW_BUDGET_MB, help='total for all headers')
+    parser.add_argument('--priority', action='append', metavar='NAME=WEIGHT',
+                        help='rate weight for a track (file name without .wav), default 1')
+    parser.add_argument('--min-rate', action='append', metavar='NAME=HZ',
+                        help=f'lowest rate for a track, default {MIN_RATE}')
+    parser.add_argument('--target-rate', type=int, default=22050)
+    parser.add_argument('--mono', action='store_true', help='force every track to mono')
+    parser.add_argument('--max-duration', type=float, default=4.0, help='seconds, 0 for no limit')
+    parser.add_argument('--fmt', choices=('text', 'hex', 'raw'), default='text')
+    parser.add_argument('--encoding', choices=('pcm16', 'mulaw', 'ima_adpcm'), default='pcm16')
+    parser.add_argument('-o', '--output-dir', default=None)
+    parser.add_argument('--stream', action='store_true', help='convert block by block')
+    parser.add_argument('--dry-run', action='store_true', help='print the plan without converting')
+    args = parser.parse_args()
+
+    priorities = _parse_overrides(args.priority, float)
+    min_rates = _parse_overrides(args.min_rate, int)
+    specs = []
+    for path in args.wav_files:
+        name = os.path.splitext(os.path.basename(path))[0]
+        specs.append(TrackSpec(path, priorities.get(name, 1.0), min_rates.get(name, MIN_RATE)))
+    max_duration = args.max_duration or None
+
+    if args.dry_run:
+        budget_bytes = args.budget_mb * 1024 * 1024
+        plans = plan_row(specs, budget_bytes, args.target_rate, args.mono, max_duration, args.fmt, args.encoding)
+        print_plan(plans, budget_bytes)
+    else:
+        build_row(specs, args.budget_mb, args.target_rate, args.mono, max_duration, args.fmt,
+                  args.output_dir, BuildCache(), args.stream, args.encoding)
@@ -0,0 +1,281 @@
+import io
+import os
+import numpy as np
+import sample_codecs
+
+SAMPLES_PER_LINE = 10       # text layout: "{s:6d}," then ' ' or '\n'
+HEX_WORDS_PER_LINE = 12     # hex layout: "0xabcd," x 12 then '\n'
+BYTES_PER_LINE = 16         # byte arrays (encoded audio): "0xab," x 16 then '\n'
+CHUNK_SAMPLES = 60 * 1024   # multiple of both line widths, so chunks end on a line break
+
+FORMATS = ('text', 'hex', 'raw')
+
+# fmt='raw' headers only define their data where this is #defined (one translation unit)
+RAW_DATA_MACRO = 'SAMPLE_DATA_IMPLEMENTATION'
+
+_text_table = None
+_hex_table = None
+_byte_table = None
+
+def _get_text_table():
+    """Fixed-width '{s:6d}, ' rendering of every int16 value, indexed by s + 32768."""
+    global _text_table
+    if _text_table is None:
+        cells = ''.join(f'{s:6d}, ' for s in range(-32768, 32768)).encode('ascii')
+        _text_table = np.frombuffer(cells, dtype=np.uint8).reshape(65536, 8)
+    return _text_table
+
+def _get_hex_table():
+    """Fixed-width '0xabcd,' rendering of every uint16 word."""
+    global _hex_table
+    if _hex_table is None:
+        cells = ''.join(f'0x{w:04x},' for w in range(65536)).encode('ascii')
+        _hex_table = np.frombuffer(cells, dtype=np.uint8).reshape(65536, 7)
+    return _hex_table
+
+def _get_byte_table():
+    """Fixed-width '0xab,' rendering of every byte."""
+    global _byte_table
+    if _byte_table is None:
+        cells = ''.join(f'0x{b:02x},' for b in range(256)).encode('ascii')
+        _byte_table = np.frombuffer(cells, dtype=np.uint8).reshape(256, 5)
+    return _byte_table
+
+def format_text_samples(samples):
+    """
+    Format int16 samples exactly like the old per-sample loop:
+    10 per line, each '{s:6d},' followed by ' ' or a newline.
+    """
+    samples = np.asarray(samples, dtype=np.int16)
+    cells = _get_text_table()[samples.astype(np.int32) + 32768]
+    cells[SAMPLES_PER_LINE - 1::SAMPLES_PER_LINE, 7] = ord('\n')
+    return cells.tobytes().decode('ascii')
+
+def format_hex_samples(samples):
+    """Format int16 samples as 16-bit hex words, 12 per line."""
+    words = np.asarray(samples, dtype=np.int16).view(np.uint16)
+    cells = _get_hex_table()[words]
+    n = len(words)
+    full = n - n % HEX_WORDS_PER_LINE
+    lines = cells[:full].reshape(-1, HEX_WORDS_PER_LINE * 7)
+    newline = np.full((len(lines), 1), ord('\n'), dtype=np.uint8)
+    out = np.hstack([lines, newline]).tobytes()
+    return (out + cells[full:].tobytes()).decode('ascii')
+
+def format_bytes(data):
+    """Format uint8 data as hex bytes, 16 per line."""
+    data = np.asarray(data, dtype=np.uint8)
+    cells = _get_byte_table()[data]
+    n = len(data)
+    full = n - n % BYTES_PER_LINE
+    lines = cells[:full].reshape(-1, BYTES_PER_LINE * 5)
+    newline = np.full((len(lines), 1), ord('\n'), dtype=np.uint8)
+    out = np.hstack([lines, newline]).tobytes()
+    return (out + cells[full:].tobytes()).decode('ascii')
+
+def estimate_byte_array_bytes(num_bytes, fmt='text'):
+    """Exact number of bytes the body of a byte array takes ('text' and 'hex' both use hex bytes)."""
+    if fmt in ('text', 'hex'):
+        return num_bytes * 5 + -(-num_bytes // BYTES_PER_LINE)
+    if fmt == 'raw':
+        return num_bytes
+    raise ValueError(f'Unknown header format: {fmt}')
+
+def estimate_array_bytes(num_samples, fmt='text'):
+    """Exact number of bytes the array body takes for num_samples in the given format."""
+    if fmt == 'text':
+        # 8 bytes per sample, plus the trailing newline of an incomplete last line
+        return num_samples * 8 + (1 if num_samples % SAMPLES_PER_LINE else 0)
+    if fmt == 'hex':
+        return num_samples * 7 + -(-num_samples // HEX_WORDS_PER_LINE)
+    if fmt == 'raw':
+        return num_samples * 2
+    raise ValueError(f'Unknown header format: {fmt}')
+
+def array_overhead_bytes(array_name, fmt='text', ctype='int16_t', bin_name=None):
+    """
+    Exact number of bytes an array declaration adds around its body: the
+    opening line and closing brace, the hex alias macro, or for 'raw' the
+    whole #embed/.incbin include (which names the .bin, so bin_name matters).
+    ctype 'int16_t' is a sample array, 'uint8_t' an encoded byte array.
+    """
+    f = io.StringIO()
+    if fmt == 'raw':
+        _write_raw_include(f, array_name, bin_name or f'{array_name}.bin', ctype)
+    elif ctype == 'int16_t':
+        write_sample_stream(f, array_name, [], fmt)
+    else:
+        write_byte_stream(f, array_name, [], fmt)
+    return len(f.getvalue().encode('utf-8'))
+
+def write_sample_array(f, array_name, samples, fmt='text', bin_filename=None):
+    """
+    Write a PROGMEM int16 array declaration for samples to the open text file f.
+
+    Args:
+        f: Open text file positioned where the declaration should go
+        array_name: C name of the array (e.g. 'drum_groove_120_bpm_data')
+        samples: Sequence or ndarray of int16 samples
+        fmt: 'text' (decimal, 10 per line), 'hex' (16-bit words) or
+             'raw' (samples go to bin_filename, the header includes them)
+        bin_filename: Path of the .bin blob to write when fmt == 'raw'
+    """
+    samples = np.asarray(samples, dtype=np.int16).reshape(-1)
+    chunks = (samples[start:start + CHUNK_SAMPLES] for start in range(0, len(samples), CHUNK_SAMPLES))
+    return write_sample_stream(f, array_name, chunks, fmt, bin_filename)
+
+def write_sample_stream(f, array_name, blocks, fmt='text', bin_filename=None):
+    """
+    Like write_sample_array, but takes an iterable of int16 blocks of any size
+    and formats each one as it arrives. Interleaved (frames, channels) blocks
+    are flattened. Returns the number of samples written.
+    """
+    if fmt == 'text':
+        f.write(f'const int16_t {array_name}[] PROGMEM = {{\n')
+        per_line, format_samples = SAMPLES_PER_LINE, format_text_samples
+    elif fmt == 'hex':
+        # uint16 storage avoids narrowing errors for 0x8000..0xffff; the macro
+        # keeps the int16_t name the sketches already use
+        f.write(f'const uint16_t {array_name}_words[] PROGMEM = {{\n')
+        per_line, format_samples = HEX_WORDS_PER_LINE, format_hex_samples
+    elif fmt == 'raw':
+        if bin_filename is None:
+            raise ValueError('bin_filename is required for raw output')
+        count = 0
+        with open(bin_filename, 'wb') as bin_file:
+            for block in blocks:
+                block = np.asarray(block, dtype='<i2').reshape(-1)
+                bin_file.write(block.tobytes())
+                count += len(block)
+        _write_raw_include(f, array_name, os.path.basename(bin_filename), 'int16_t')
+        return count
+    else:
+        raise ValueError(f'Unknown header format: {fmt}')
+
+    # Carry a partial line between blocks so the layout matches a one-shot write
+    count = 0
+    pending = np.zeros(0, dtype=np.int16)
+    for block in blocks:
+        block = np.asarray(block, dtype=np.int16).reshape(-1)
+        count += len(block)
+        data = np.concatenate([pending, block]) if len(pending) else block
+        cut = len(data) - len(data) % per_line
+        if cut:
+            f.write(format_samples(data[:cut]))
+        pending = data[cut:]
+    if len(pending):
+        f.write(format_samples(pending))
+        f.write('\n')
+
+    if fmt == 'text':
+        f.write('};\n\n')
+    else:
+        f.write('};\n')
+        f.write(f'#define {array_name} ((const int16_t *){array_name}_words)\n\n')
+    return count
+
+def write_byte_stream(f, array_name, chunks, fmt='text', bin_filename=None):
+    """
+    Write a PROGMEM uint8_t array (encoded audio) from an iterable of byte chunks.
+
+    'text' and 'hex' both emit hex bytes, 16 per line; 'raw' writes the bytes
+    to bin_filename and includes them like write_sample_stream does.
+    Returns the number of bytes written.
+    """
+    if fmt == 'raw':
+        if bin_filename is None:
+            raise ValueError('bin_filename is required for raw output')
+        count = 0
+        with open(bin_filename, 'wb') as bin_file:
+            for chunk in chunks:
+                chunk = np.asarray(chunk, dtype=np.uint8).reshape(-1)
+                bin_file.write(chunk.tobytes())
+                count += len(chunk)
+        _write_raw_include(f, array_name, os.path.basename(bin_filename), 'uint8_t')
+        return count
+    if fmt not in ('text', 'hex'):
+        raise ValueError(f'Unknown header format: {fmt}')
+
+    f.write(f'const uint8_t {array_name}[] PROGMEM = {{\n')
+    count = 0
+    pending = np.zeros(0, dtype=np.uint8)
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.uint8).reshape(-1)
+        count += len(chunk)
+        data = np.concatenate([pending, chunk]) if len(pending) else chunk
+        cut = len(data) - len(data) % BYTES_PER_LINE
+        if cut:
+            f.write(format_bytes(data[:cut]))
+        pending = data[cut:]
+    if len(pending):
+        f.write(format_bytes(pending))
+        f.write('\n')
+    f.write('};\n\n')
+    return count
+
+def _write_raw_include(f, array_name, bin_name, ctype):
+    """
+    Declare array_name (of ctype) over an external .bin via #embed, falling back to .incbin.
+
+    Every includer sees an extern declaration (C linkage, so the asm label
+    matches in C and C++); the data itself is only emitted where
+    RAW_DATA_MACRO is defined, so several translation units can include the
+    header without defining the symbol twice.
+    """
+    if ctype == 'int16_t':
+        f.write(f'// raw little-endian int16 samples in {bin_name}\n')
+    else:
+        f.write(f'// raw encoded bytes in {bin_name}\n')
+    f.write(f'// #define {RAW_DATA_MACRO} in exactly one source file before including this header\n')
+    f.write('#ifdef __cplusplus\n')
+    f.write(f'extern "C" const uint8_t {array_name}_bytes[];\n')
+    f.write('#else\n')
+    f.write(f'extern const uint8_t {array_name}_bytes[];\n')
+    f.write('#endif\n')
+    f.write(f'#define {array_name} ((const {ctype} *){array_name}_bytes)\n')
+    f.write(f'#ifdef {RAW_DATA_MACRO}\n')
+    f.write('#if defined(__has_embed)\n')
+    f.write(f'alignas(4) const uint8_t {array_name}_bytes[] PROGMEM = {{\n')
+    f.write(f'#embed "{bin_name}"\n')
+    f.write('};\n')
+    f.write('#else\n')
+    f.write('__asm__(\n')
+    f.write('  ".section .rodata\\n"\n')
+    f.write('  ".balign 4\\n"\n')
+    f.write(f'  ".global {array_name}_bytes\\n"\n')
+    f.write(f'  "{array_name}_bytes:\\n"\n')
+    f.write(f'  ".incbin \\"{bin_name}\\"\\n"\n')
+    f.write('  ".previous\\n");\n')
+    f.write('#endif\n')
+    f.write(f'#endif // {RAW_DATA_MACRO}\n\n')
+
+def codec_tables_text(encoding):
+    """
+    Shared decoder tables and layout notes the firmware needs for an encoding.
+
+    Guarded so several tracks with the same encoding can be included together.
+    """
+    if encoding == 'pcm16':
+        return ''
+    if encoding == 'mulaw':
+        table = ', '.join(str(v) for v in sample_codecs.mulaw_decode_table())
+        return ('#ifndef MULAW_DECODE_TABLE\n'
+                '#define MULAW_DECODE_TABLE\n'
+                '// 8-bit G.711 mu-law: sample = mulaw_decode_table[code]\n'
+                f'static const int16_t mulaw_decode_table[256] PROGMEM = {{{table}}};\n'
+                '#endif\n\n')
+    if encoding == 'ima_adpcm':
+        steps = ', '.join(str(v) for v in sample_codecs.IMA_STEP_TABLE)
+        indexes = ', '.join(str(v) for v in sample_codecs.IMA_INDEX_TABLE)
+        return ('#ifndef IMA_ADPCM_TABLES\n'
+                '#define IMA_ADPCM_TABLES\n'
+                f'// IMA-ADPCM, mono, {sample_codecs.IMA_BLOCK_BYTES}-byte blocks of '
+                f'{sample_codecs.IMA_BLOCK_SAMPLES} samples:\n'
+                '//   int16 predictor (= first sample), uint8 step index, uint8 reserved,\n'
+                '//   then 4-bit codes, low nibble first. Decoding restarts at every block header.\n'
+                f'#define IMA_ADPCM_BLOCK_BYTES {sample_codecs.IMA_BLOCK_BYTES}\n'
+                f'#define IMA_ADPCM_BLOCK_SAMPLES {sample_codecs.IMA_BLOCK_SAMPLES}\n'
+                f'static const int16_t ima_step_table[89] PROGMEM = {{{steps}}};\n'
+                f'static const int8_t ima_index_table[16] PROGMEM = {{{indexes}}};\n'
+                '#endif\n\n')
+    raise ValueError(f'Unknown encoding: {encoding}')
@@ -0,0 +1,163 @@
+import re
+from collections import namedtuple
+import numpy as np
+
+BEATS_PER_BAR = 4
+MIN_BPM = 60
+MAX_BPM = 200
+SEAM_WINDOW_SEC = 0.005   # how far the cut may move to find a clean seam
+ANALYSIS_SEC = 30.0       # at most this much audio is read for tempo detection
+PRIOR_BPM = 120.0         # tempo prior (log-normal, one octave wide) against half/double-time picks
+
+LoopCut = namedtuple('LoopCut', ['frames', 'bpm', 'count', 'unit', 'bpm_source'])
+
+_BPM_RE = re.compile(r'(?<![\d.])(\d{2,3}(?:\.\d+)?)[-_ ]?bpm|bpm[-_ ]?(\d{2,3}(?:\.\d+)?)(?![\d.])', re.I)
+
+def bpm_from_filename(name):
+    """Tempo from names like 'Groove-loop-126-bpm' or '120-bpm-hip-hop-drum-loop', else None."""
+    for match in _BPM_RE.finditer(name):
+        bpm = float(match.group(1) or match.group(2))
+        if MIN_BPM / 2 <= bpm <= MAX_BPM * 1.5:
+            return bpm
+    return None
+
+def to_mono_float(samples):
+    """(frames, channels) or 1-D int16 samples as a 1-D float64 channel sum."""
+    samples = np.asarray(samples)
+    if samples.ndim == 2:
+        return samples.sum(axis=1, dtype=np.float64)
+    return samples.astype(np.float64)
+
+def estimate_bpm(mono, framerate, min_bpm=MIN_BPM, max_bpm=MAX_BPM):
+    """
+    Estimate the tempo of a loop from its onset envelope.
+
+    Spectral flux over ~10 ms hops (all frames in one rfft), autocorrelated
+    with an FFT. Lags between max_bpm and min_bpm are weighted by a tempo
+    prior around PRIOR_BPM so a loop's half-time period doesn't win over its
+    beat, and the best one is refined with a parabola through its neighbours.
+    Returns None when the audio is too short or has no onsets.
+    """
+    x = to_mono_float(mono)
+    hop = max(1, int(framerate * 0.01))
+    n_fft = 4 * hop
+    if len(x) < n_fft + hop * 8:
+        return None
+    frames = np.lib.stride_tricks.sliding_window_view(x, n_fft)[::hop] * np.hanning(n_fft)
+    spectrum = np.log1p(np.abs(np.fft.rfft(frames, axis=1)))
+    flux = np.maximum(np.diff(spectrum, axis=0), 0).sum(axis=1)
+    flux -= flux.mean()
+    if not np.any(flux):
+        return None
+
+    n = len(flux)
+    ac = np.fft.irfft(np.abs(np.fft.rfft(flux, 2 * n)) ** 2)[:n]
+    hop_sec = hop / framerate
+    min_lag = max(1, int(60.0 / max_bpm / hop_sec))
+    max_lag = min(n - 2, int(np.ceil(60.0 / min_bpm / hop_sec)))
+    if max_lag <= min_lag:
+        return None
+    lags = np.arange(min_lag, max_lag + 1)
+    prior = np.exp(-0.5 * np.log2(60.0 / (lags * hop_sec) / PRIOR_BPM) ** 2)
+    lag = min_lag + int(np.argmax(ac[min_lag:max_lag + 1] * prior))
+    if ac[lag] <= 0:
+        return None
+    a, b, c = ac[lag - 1], ac[lag], ac[lag + 1]
+    shift = 0.5 * (a - c) / (a - 2 * b + c) if a - 2 * b + c != 0 else 0.0
+    return 60.0 / ((lag + shift) * hop_sec)
+
+def whole_bar_frames(n_frames, framerate, bpm, fits=None, beats_per_bar=BEATS_PER_BAR):
+    """
+    Longest cut made of whole bars (or whole beats, if not even one bar fits).
+
+    fits(frames) -> bool, if given, is the byte budget check: the count is
+    lowered until the cut fits. Returns (frames, count, unit) or None when
+    not even one beat fits.
+    """
+    beat = 60.0 * framerate / bpm
+    for unit, length in (('bars', beat * beats_per_bar), ('beats', beat)):
+        count = int(n_frames // length)
+        while count > 0 and fits is not None and not fits(int(round(count * length))):
+            count -= 1
+        if count > 0:
+            return min(n_frames, int(round(count * length))), count, unit
+    return None
+
+def align_seam(head, window, window_start):
+    """
+    Move a loop end to where wrapping back to the start is smoothest.
+
+    head is the first two mono samples, window the mono samples from
+    window_start on. Returns the end frame e (the loop is frames [0, e)) whose
+    sample e best matches the start in value and slope, which is where a
+    zero-crossing start meets a zero crossing going the same way.
+    """
+    if len(window) < 2 or len(head) < 2:
+        return window_start + len(window) // 2
+    slope = head[1] - head[0]
+    value_error = np.abs(window[1:] - head[0])
+    slope_error = np.abs(np.diff(window) - slope)
+    cost = value_error + 0.5 * slope_error
+    # Prefer the nominal (centre) position on ties
+    centre = (len(cost) - 1) / 2
+    order = np.lexsort((np.abs(np.arange(len(cost)) - centre), cost))
+    return window_start + 1 + int(order[0])
+
+def _loop_cut(n_frames, framerate, read, name, fits, beats_per_bar, bpm):
+    """Shared part of find_loop_cut and loop_cut_from_wav; read(start, count) returns mono floats."""
+    source = 'given'
+    if bpm is None and name is not None:
+        bpm, source = bpm_from_filename(name), 'filename'
+    if bpm is None:
+        bpm, source = estimate_bpm(read(0, min(n_frames, int(ANALYSIS_SEC * framerate))), framerate), 'detected'
+    if bpm is None:
+        return None
+
+    chosen = whole_bar_frames(n_frames, framerate, bpm, fits, beats_per_bar)
+    if chosen is None:
+        return None
+    end, count, unit = chosen
+    w = int(SEAM_WINDOW_SEC * framerate)
+    hi = min(n_frames - 1, end + w)
+    if fits is not None and hi > end and not fits(hi):
+        hi = end
+    lo = max(2, end - w)
+    if hi > lo:
+        end = align_seam(read(0, 2), read(lo - 1, hi - lo + 2), lo - 1)
+    return LoopCut(end, bpm, count, unit, source)
+
+def find_loop_cut(samples, framerate, name=None, fits=None, beats_per_bar=BEATS_PER_BAR, bpm=None):
+    """
+    Cut a loop to whole bars with a clean seam.
+
+    samples: int16 (frames, channels) or mono 1-D array, already capped at
+    the longest allowed duration. The tempo comes from bpm, else the name,
+    else estimate_bpm. fits(frames) -> bool limits the cut to the byte budget
+    (see whole_bar_frames). The seam search only moves the cut to lengths
+    that are still available and still fit.
+
+    Returns:
+        LoopCut(frames, bpm, count, unit, bpm_source), or None when no tempo
+        was found or not even one beat fits.
+    """
+    mono = to_mono_float(samples)
+    return _loop_cut(len(mono), framerate, lambda start, count: mono[start:start + count],
+                     name, fits, beats_per_bar, bpm)
+
+def loop_cut_from_wav(wav, n_frames, name=None, fits=None, beats_per_bar=BEATS_PER_BAR, bpm=None):
+    """
+    find_loop_cut for an open 16-bit wave reader, considering its first n_frames frames.
+
+    Only the tempo analysis span (when the name has no BPM) and the few
+    milliseconds around the seam are read; the reader is rewound afterwards.
+    """
+    n_channels = wav.getnchannels()
+
+    def read(start, count):
+        wav.setpos(start)
+        return to_mono_float(np.frombuffer(wav.readframes(count), dtype='<i2').reshape(-1, n_channels))
+
+    try:
+        return _loop_cut(n_frames, wav.getframerate(), read, name, fits, beats_per_bar, bpm)
+    finally:
+        wav.rewind()
@@ -0,0 +1,76 @@
+import json
+import time
+import contextlib
+from collections import OrderedDict
+
+class JsonLinesSink:
+    """Metrics sink that appends one JSON object per stage record to a file."""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __call__(self, record):
+        with open(self.path, 'a') as f:
+            f.write(json.dumps(record) + '\n')
+
+class PipelineMetrics:
+    """
+    Collects per-stage timing and sample/byte counts from the converters.
+
+    Pass an instance as metrics= to convert_wav_to_header, compress_wav or
+    convert_wavs. Every finished stage becomes a record dict such as
+    {'file': ..., 'stage': 'resample', 'seconds': 0.012, 'samples_in': 88200,
+    'samples_out': 44100}, which is kept in .records and handed to sink (any
+    callable, e.g. a JsonLinesSink). report() aggregates per stage over
+    everything recorded, for batch runs.
+    """
+
+    def __init__(self, sink=None):
+        self.sink = sink
+        self.records = []
+
+    def add(self, record):
+        """Record a finished stage (also used to merge records from worker processes)."""
+        self.records.append(record)
+        if self.sink is not None:
+            self.sink(record)
+
+    def summary(self):
+        """Per-stage totals, in the order the stages were first seen."""
+        totals = OrderedDict()
+        for record in self.records:
+            total = totals.setdefault(record['stage'], dict(calls=0, seconds=0.0, samples_in=0,
+                                                            samples_out=0, bytes_in=0, bytes_out=0))
+            total['calls'] += 1
+            for key in ('seconds', 'samples_in', 'samples_out', 'bytes_in', 'bytes_out'):
+                total[key] += record.get(key) or 0
+        return totals
+
+    def report(self):
+        """Print the per-stage totals with each stage's share of the time."""
+        totals = self.summary()
+        elapsed = sum(t['seconds'] for t in totals.values()) or 1e-9
+        files = len({r.get('file') for r in self.records})
+        print(f'Stage timings ({files} file(s)):')
+        for stage, t in totals.items():
+            rate = f", {t['samples_in'] / t['seconds'] / 1e6:.1f} M samples/s" if t['samples_in'] and t['seconds'] else ''
+            moved = t['bytes_in'] + t['bytes_out']
+            size = f', {moved / 1024 / 1024:.2f} MB' if moved else ''
+            print(f"  {stage:16s} {t['seconds'] * 1000:9.1f} ms {t['seconds'] / elapsed:5.0%} "
+                  f"({t['calls']} call(s){size}{rate})")
+
+@contextlib.contextmanager
+def stage(metrics, name, **fields):
+    """
+    Time the with-block as stage name and record it on metrics.
+
+    Yields the record dict so the block can fill in samples_in/samples_out,
+    bytes_in/bytes_out or anything else worth keeping. With metrics=None it
+    still yields a dict but records nothing.
+    """
+    record = dict(fields, stage=name)
+    t0 = time.perf_counter()
+    yield record
+    if metrics is not None:
+        record['seconds'] = time.perf_counter() - t0
+        metrics.add(record)
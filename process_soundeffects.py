@@ -1,13 +1,116 @@
 import zipfile
 import os
+import sys
+import io
 import shutil
 import glob
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+from conversion_compressed import convert_wav_to_header
+from build_cache import BuildCache
+from pipeline_metrics import PipelineMetrics, JsonLinesSink
 
-def extract_and_convert_zips(zip_dir="soundeffects", wav_output_dir="soundeffects_wavs", header_output_dir="soundeffects_headers"):
-    """Extract WAV files from zip files and convert them to header files."""
+# Per-track settings for the sound-effect headers
+CONVERT_KWARGS = dict(
+    max_size_mb=0.23,
+    target_rate=22050,
+    force_mono=True,
+    max_duration_sec=4.0
+)
+
+def find_wav_member(zip_ref):
+    """Return the name of the first WAV in the zip's central directory, or None."""
+    for info in zip_ref.infolist():
+        name = info.filename
+        if info.is_dir() or name.startswith('__MACOSX/') or os.path.basename(name).startswith('._'):
+            continue
+        if name.lower().endswith('.wav'):
+            return name
+    return None
+
+def _convert_source(source, header_output_dir, wav_output_dir, cache=None, metrics=None):
+    """Convert a WAV path or a (zip_path, member) pair, decoding zip members in place."""
+    kwargs = dict(CONVERT_KWARGS, output_dir=header_output_dir, cache=cache, metrics=metrics)
+    if isinstance(source, str):
+        return convert_wav_to_header(source, **kwargs)
+    
+    zip_path, member = source
+    with zipfile.ZipFile(zip_path, 'r') as zip_ref:
+        if wav_output_dir is not None:
+            # Optional intermediate copy, streamed straight from the archive
+            dest_path = os.path.join(wav_output_dir, os.path.basename(member))
+            with zip_ref.open(member) as src, open(dest_path, 'wb') as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            return convert_wav_to_header(dest_path, **kwargs)
+        with zip_ref.open(member) as wav_stream:
+            return convert_wav_to_header(wav_stream, **kwargs)
+
+def _convert_one(source, header_output_dir, wav_output_dir=None, cache=None, collect_metrics=False):
+    """
+    Convert a single WAV path or (zip_path, member) pair into header_output_dir.
+    
+    Runs inside a worker process, so the converter's progress output is captured
+    and handed back with the result to be printed in submission order. The same
+    goes for the stage metrics records when collect_metrics is set.
+    Returns (source, header_filename, size, log, error, records).
+    """
+    log = io.StringIO()
+    metrics = PipelineMetrics() if collect_metrics else None
+    records = metrics.records if metrics is not None else []
+    try:
+        with contextlib.redirect_stdout(log):
+            header_filename, size = _convert_source(source, header_output_dir, wav_output_dir, cache, metrics)
+        return source, header_filename, size, log.getvalue(), None, records
+    except Exception as e:
+        return source, None, 0, log.getvalue(), f"{type(e).__name__}: {e}", records
+
+def convert_wavs(wav_files, header_output_dir, workers=None, wav_output_dir=None, cache=None, metrics=None):
+    """
+    Convert WAV files to headers in header_output_dir using a process pool.
+    
+    Args:
+        wav_files: WAV paths or (zip_path, member) pairs to convert
+        header_output_dir: Directory the headers are written to
+        workers: Number of worker processes (None = one per CPU, 1 = run in this process)
+        wav_output_dir: If set, zip members are also written here as WAV files
+        cache: Optional BuildCache shared by the workers to skip unchanged inputs
+        metrics: Optional PipelineMetrics; each worker's stage records are
+                 added to it in the order of wav_files
+    
+    Returns:
+        List of (source, header_filename, size, log, error) in the order of wav_files
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(1, min(workers, len(wav_files)))
+    
+    collect = metrics is not None
+    if workers == 1:
+        results = [_convert_one(wav_file, header_output_dir, wav_output_dir, cache, collect) for wav_file in wav_files]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_convert_one, wav_file, header_output_dir, wav_output_dir, cache, collect)
+                       for wav_file in wav_files]
+            results = [future.result() for future in futures]
+    
+    for *_, records in results:
+        for record in records:
+            metrics.add(record)
+    return [result[:-1] for result in results]
+
+def extract_and_convert_zips(zip_dir="soundeffects", wav_output_dir=None, header_output_dir="soundeffects_headers", workers=None, cache=None, metrics=None):
+    """
+    Convert the first WAV in each zip file to a header file.
+    
+    WAV members are decoded straight out of the archives; nothing is extracted
+    unless wav_output_dir is given, in which case each chosen WAV is also
+    written there. Pass a BuildCache as cache to skip unchanged tracks, and a
+    PipelineMetrics as metrics for per-stage timings plus a report at the end.
+    """
     
     # Create output directories
-    os.makedirs(wav_output_dir, exist_ok=True)
+    if wav_output_dir is not None:
+        os.makedirs(wav_output_dir, exist_ok=True)
     os.makedirs(header_output_dir, exist_ok=True)
     
     zip_files = glob.glob(os.path.join(zip_dir, "*.zip"))
@@ -15,72 +118,55 @@ def extract_and_convert_zips(zip_dir="soundeffects", wav_output_dir="soundeffect
     
     wav_files = []
     
-    # Extract WAV files from each zip
+    # Pick a WAV member from each zip's central directory
     for zip_path in zip_files:
         print(f"Processing: {os.path.basename(zip_path)}")
         try:
             with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-                # Extract all files to temp location
-                temp_dir = zip_path.replace('.zip', '_temp')
-                zip_ref.extractall(temp_dir)
-                
-                # Find WAV files in extracted folder
-                wavs = glob.glob(os.path.join(temp_dir, "**/*.wav"), recursive=True)
+                member = find_wav_member(zip_ref)
                 
-                if wavs:
-                    # Copy first WAV found to output directory
-                    wav_file = wavs[0]
-                    base_name = os.path.basename(wav_file)
-                    dest_path = os.path.join(wav_output_dir, base_name)
-                    shutil.copy2(wav_file, dest_path)
-                    wav_files.append(dest_path)
-                    print(f"  ✓ Extracted: {base_name}")
+                if member:
+                    wav_files.append((zip_path, member))
+                    print(f"  ✓ Found: {os.path.basename(member)}")
                 else:
                     print(f"  ⚠ No WAV file found in {os.path.basename(zip_path)}")
-                
-                # Clean up temp directory
-                shutil.rmtree(temp_dir, ignore_errors=True)
         except Exception as e:
             print(f"  ✗ Error processing {os.path.basename(zip_path)}: {e}")
         print()
     
-    print(f"Extracted {len(wav_files)} WAV files to {wav_output_dir}\n")
+    print(f"Found {len(wav_files)} WAV files\n")
     
     # Convert WAV files to headers
     if wav_files:
         print("Converting WAV files to header files...\n")
-        # Import conversion function
-        import sys
-        sys.path.insert(0, os.getcwd())
-        from conversion_compressed import convert_wav_to_header
-        
-        # Change to header output directory so headers are saved there
-        original_cwd = os.getcwd()
-        os.chdir(header_output_dir)
         
-        try:
-            total_size = 0
-            for wav_file in wav_files:
-                wav_path = os.path.join(original_cwd, wav_file)
-                if os.path.exists(wav_path):
-                    _, size = convert_wav_to_header(
-                        wav_path, 
-                        max_size_mb=0.23,
-                        target_rate=22050,
-                        force_mono=True,
-                        max_duration_sec=4.0
-                    )
-                    total_size += size
-                    print()
-        finally:
-            os.chdir(original_cwd)
+        total_size = 0
+        failed = []
+        for (_, member), _, size, log, error in convert_wavs(wav_files, header_output_dir, workers, wav_output_dir, cache, metrics):
+            print(log, end='')
+            if error is not None:
+                print(f"  ✗ Error converting {os.path.basename(member)}: {error}")
+                failed.append(member)
+            total_size += size
+            print()
         
         print(f"\n✓ Conversion complete!")
         print(f"  Headers saved to: {header_output_dir}")
+        print(f"  Converted: {len(wav_files) - len(failed)}/{len(wav_files)}")
         print(f"  Total size: {total_size/1024/1024:.2f} MB")
+        if failed:
+            print(f"  ⚠ {len(failed)} file(s) failed: {', '.join(os.path.basename(w) for w in failed)}")
+        if metrics is not None and metrics.records:
+            print()
+            metrics.report()
     else:
         print("No WAV files to convert")
 
 if __name__ == '__main__':
-    extract_and_convert_zips()
-
+    # Optional arguments: number of worker processes (default: one per CPU)
+    # and a directory to also write the chosen WAVs to (default: none)
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    wav_output_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    # Stage timings are appended to this file as JSON lines and summarized at the end
+    metrics = PipelineMetrics(JsonLinesSink('soundeffects_metrics.jsonl'))
+    extract_and_convert_zips(wav_output_dir=wav_output_dir, workers=workers, cache=BuildCache(), metrics=metrics)
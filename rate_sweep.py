@@ -0,0 +1,200 @@
+import os
+import sys
+import json
+import argparse
+from collections import namedtuple
+import numpy as np
+from conversion_compressed import convert_wav_to_header, estimate_header_size, resampled_length
+from sample_codecs import ENCODINGS, encode, decode
+from resampler import resample_poly
+from streaming import to_int16
+from audio_stages import duration_frames
+from wav_reader import open_wav
+from build_cache import BuildCache
+
+SWEEP_RATES = (8000, 11025, 12000, 16000, 18000, 22050, 32000, 44100)
+BAND_HZ = (50.0, 16000.0)  # spectral error is measured inside this band (capped at the source Nyquist)
+FFT_SIZE = 2048
+SPECTRAL_FLOOR_DB = -60.0  # bins this far below a frame's peak count as silent in both spectra
+SILENT_FRAME_DB = -50.0    # frames this far below the loudest one are left out of the spectral error
+MAX_SNR_DB = 120.0         # reported for candidates that reproduce their band exactly
+
+# One point of a track's size/quality curve, from the decoded audio upsampled back to the
+# source rate (mono mix, after the duration cut). spectral_error_db compares it with the
+# source inside BAND_HZ, so it grows as the rate drops; snr_db compares it with the source
+# band-limited to the candidate's rate, so it measures the encoding's noise alone
+SweepPoint = namedtuple('SweepPoint', ['rate', 'encoding', 'n_channels', 'size_bytes', 'snr_db',
+                                       'spectral_error_db'])
+
+def load_source(wav_filename, max_duration_sec=None):
+    """(int16 (frames, channels) samples, framerate), cut to max_duration_sec like the converter."""
+    with open_wav(wav_filename) as wav:
+        framerate = wav.getframerate()
+        n_frames = wav.getnframes()
+        if max_duration_sec is not None:
+            n_frames = min(n_frames, duration_frames(max_duration_sec, framerate, wav.getnchannels()))
+        return np.array(wav.frames(0, n_frames)), framerate
+
+def snr_batch(reference, decoded, max_db=MAX_SNR_DB):
+    """SNR in dB of every column of decoded (n, k) against reference (n,), capped at max_db."""
+    err = decoded - reference[:, None]
+    noise = np.einsum('nk,nk->k', err, err)
+    signal_power = np.dot(reference, reference)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        snr = 10 * np.log10(signal_power / noise)
+    return np.where(np.isnan(snr), max_db, np.minimum(snr, max_db))
+
+def spectral_error_batch(reference, decoded, framerate, band=BAND_HZ, n_fft=FFT_SIZE):
+    """
+    Band-limited log-spectral distance (dB) of every column of decoded against reference.
+
+    Hann-windowed frames of n_fft samples; for each frame the RMS dB
+    difference over the bins in band, with both spectra floored at
+    SPECTRAL_FLOOR_DB below the frame's reference peak so lost content costs
+    at most that much. Frames near silence are skipped and the rest averaged.
+    All columns go through one rfft.
+    """
+    n_frames = len(reference) // n_fft
+    if n_frames == 0:
+        return np.zeros(decoded.shape[1])
+    window = np.hanning(n_fft)
+    signals = np.concatenate([reference[:, None], decoded], axis=1)[:n_frames * n_fft]
+    frames = signals.reshape(n_frames, n_fft, -1) * window[None, :, None]
+    power = np.abs(np.fft.rfft(frames, axis=1)) ** 2                   # (frames, bins, 1 + k)
+    freqs = np.fft.rfftfreq(n_fft, 1.0 / framerate)
+    in_band = (freqs >= band[0]) & (freqs <= min(band[1], framerate / 2))
+    power = power[:, in_band]
+
+    ref_power = power[:, :, :1]
+    frame_peak = ref_power.max(axis=1, keepdims=True)
+    floor = frame_peak * 10 ** (SPECTRAL_FLOOR_DB / 10) + 1e-12
+    diff_db = 10 * np.log10((power[:, :, 1:] + floor) / (ref_power + floor))
+    per_frame = np.sqrt(np.mean(diff_db ** 2, axis=1))                 # (frames, k)
+
+    loud = frame_peak[:, 0, 0] >= frame_peak.max() * 10 ** (SILENT_FRAME_DB / 10)
+    return per_frame[loud].mean(axis=0) if loud.any() else np.zeros(decoded.shape[1])
+
+def sweep_track(wav_filename, rates=SWEEP_RATES, encodings=ENCODINGS, max_rate=22050, force_mono=False,
+                max_duration_sec=None, fmt='text'):
+    """
+    Measure size against quality for every (rate, encoding) candidate of a track.
+
+    Each candidate rate is rendered once for all encodings: the source is
+    resampled (as the converter would), every encoding is encoded and
+    decoded, and all decoded versions are upsampled back to the source rate
+    in one 2-D call together with the resampled source before rounding.
+    spectral_error_batch scores them against the source, snr_batch against
+    that band-limited copy. Quality is measured on the mono mix; sizes
+    count the channels the header would keep (IMA-ADPCM is always mono).
+    Rates above max_rate or the source rate are skipped.
+
+    Returns a list of SweepPoint sorted by size.
+    """
+    samples, framerate = load_source(wav_filename, max_duration_sec)
+    n_frames, n_channels = samples.shape
+    if force_mono:
+        n_channels = 1
+    base_name = os.path.splitext(os.path.basename(wav_filename))[0]
+    var_name = base_name.replace('-', '_').replace(' ', '_').lower()
+    reference = samples.mean(axis=1)
+
+    top = min(max_rate, framerate)
+    candidates = sorted({r for r in rates if r <= top} | {top})
+    points = []
+    for rate in candidates:
+        band = resample_poly(reference, framerate, rate) if rate != framerate else reference
+        low = to_int16(band)
+        # The unquantised band goes through the same upsampling as the decoded columns
+        decoded = np.stack([band] + [decode(encode(low, enc), enc, len(low)) for enc in encodings], axis=1)
+        if rate != framerate:
+            decoded = resample_poly(decoded, rate, framerate, n_frames)
+        decoded = decoded.astype(np.float64)
+        band, decoded = decoded[:, 0], decoded[:, 1:]
+        snrs = snr_batch(band, decoded)
+        errors = spectral_error_batch(reference, decoded, framerate)
+        out_frames = resampled_length(n_frames, framerate, rate)
+        for enc, snr, error in zip(encodings, snrs, errors):
+            channels = 1 if enc == 'ima_adpcm' else n_channels
+            size = estimate_header_size(out_frames * channels, var_name, fmt, enc, rate, channels)
+            points.append(SweepPoint(rate, enc, channels, size, float(snr), float(error)))
+    return sorted(points, key=lambda p: (p.size_bytes, -p.snr_db))
+
+def pick_setting(points, max_spectral_error_db=None, min_snr_db=None, max_size_bytes=None):
+    """
+    Cheapest point meeting the quality targets (and size limit), else None.
+
+    max_spectral_error_db is the main target: it is what separates rates.
+    min_snr_db additionally bounds the encoding's noise within the band.
+    Targets left as None are not checked.
+    """
+    for point in sorted(points, key=lambda p: (p.size_bytes, -p.snr_db)):
+        if max_size_bytes is not None and point.size_bytes > max_size_bytes:
+            continue
+        if max_spectral_error_db is not None and point.spectral_error_db > max_spectral_error_db:
+            continue
+        if min_snr_db is not None and point.snr_db < min_snr_db:
+            continue
+        return point
+    return None
+
+def print_curve(wav_filename, points, picked=None):
+    """Size/quality table for one track, the picked point marked with *."""
+    print(f'{wav_filename}')
+    print(f'  {"rate":>6s}  {"encoding":10s} {"ch":>2s} {"size":>10s}  {"SNR":>7s}  {"spec.err":>8s}')
+    for p in points:
+        mark = '*' if p == picked else ' '
+        print(f'{mark} {p.rate:6d}  {p.encoding:10s} {p.n_channels:2d} {p.size_bytes:10,d}  '
+              f'{p.snr_db:5.1f}dB  {p.spectral_error_db:6.2f}dB')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep rates and encodings per track and pick by measured quality.')
+    parser.add_argument('wav_files', nargs='+')
+    parser.add_argument('--quality', type=float, metavar='DB',
+                        help='maximum band-limited spectral error in dB; picks the smallest setting within it')
+    parser.add_argument('--min-snr', type=float, metavar='DB',
+                        help='also require this in-band SNR (encoding noise at the picked rate)')
+    parser.add_argument('--max-size-mb', type=float, help='skip settings whose header is larger')
+    parser.add_argument('--max-rate', type=int, default=22050, help='highest rate to consider')
+    parser.add_argument('--encodings', nargs='+', choices=ENCODINGS, default=list(ENCODINGS))
+    parser.add_argument('--mono', action='store_true', help='size every setting as mono')
+    parser.add_argument('--max-duration', type=float, default=4.0, help='seconds, 0 for no limit')
+    parser.add_argument('--fmt', choices=('text', 'hex', 'raw'), default='text')
+    parser.add_argument('-o', '--output', help='write every curve (and pick) to this JSON file')
+    parser.add_argument('--convert', metavar='OUTPUT_DIR', help='convert each track with its picked setting')
+    args = parser.parse_args()
+
+    max_duration = args.max_duration or None
+    max_size_bytes = None if args.max_size_mb is None else args.max_size_mb * 1024 * 1024
+    targets = args.quality is not None or args.min_snr is not None or max_size_bytes is not None
+    results = {}
+    missed = []
+    cache = BuildCache() if args.convert else None
+    for wav_file in args.wav_files:
+        points = sweep_track(wav_file, encodings=args.encodings, max_rate=args.max_rate, force_mono=args.mono,
+                             max_duration_sec=max_duration, fmt=args.fmt)
+        picked = pick_setting(points, args.quality, args.min_snr, max_size_bytes) if targets else None
+        print_curve(wav_file, points, picked)
+        if targets and picked is None:
+            missed.append(wav_file)
+            print(f'  ✗ No setting meets the target')
+        elif picked is not None:
+            print(f'  ✓ {picked.rate} Hz {picked.encoding}: {picked.size_bytes:,} bytes, '
+                  f'{picked.spectral_error_db:.2f} dB spectral error, {picked.snr_db:.1f} dB SNR')
+            if args.convert:
+                os.makedirs(args.convert, exist_ok=True)
+                # Sized so the solver keeps the picked rate and channels
+                convert_wav_to_header(wav_file, max_size_mb=picked.size_bytes / 1024 / 1024 * 1.01,
+                                      target_rate=picked.rate, force_mono=picked.n_channels == 1,
+                                      max_duration_sec=max_duration, fmt=args.fmt, output_dir=args.convert,
+                                      cache=cache, encoding=picked.encoding)
+        print()
+        results[wav_file] = dict(curve=[p._asdict() for p in points],
+                                 picked=None if picked is None else picked._asdict())
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'✓ Wrote {args.output}')
+    if missed:
+        print(f'⚠ {len(missed)} track(s) missed the target: {", ".join(os.path.basename(w) for w in missed)}')
+        sys.exit(1)
@@ -0,0 +1,258 @@
+import os
+import re
+import glob
+import json
+import time
+import wave
+import hashlib
+import argparse
+import itertools
+from collections import namedtuple
+import numpy as np
+from sample_codecs import decode
+
+ISR_RATE = 22050   # SAMPLE_RATE the rowN_rp2040 timer ISR runs at
+N_SLOTS = 4        # track1..track4 in the sketches
+
+Track = namedtuple('Track', ['name', 'samples', 'rate', 'channels'])
+
+_ARRAY_RE = re.compile(r'const (int16_t|uint16_t|uint8_t) (\w+)\[\] PROGMEM = \{\n(.*?)\};', re.S)
+_NUMBER_DEFINE_RE = re.compile(r'#define (\w+) (\d+)')
+_DEFINE_KINDS = ('LENGTH', 'RATE', 'CHANNELS', 'ENCODING', 'BYTES')
+# conversion.py's fixed names for its audio_data array
+_AUDIO_DEFINES = {'AUDIO_DATA_LENGTH': 'LENGTH', 'AUDIO_SAMPLE_RATE': 'RATE', 'AUDIO_N_CHANNELS': 'CHANNELS'}
+_BIN_RE = re.compile(r'#embed "([^"]+)"')
+_SYMBOL_RE = re.compile(r'#define (\w+) \(\(const (\w+) \*\)\w+\)')
+
+_ENCODING_NAMES = {0: 'pcm16', 1: 'mulaw', 2: 'ima_adpcm'}
+
+# ASCII hex digit -> value, for parsing the fixed-width hex layouts without a Python loop
+_HEX_LUT = np.zeros(256, dtype=np.uint16)
+_HEX_LUT[np.frombuffer(b'0123456789abcdef', dtype=np.uint8)] = np.arange(16)
+_HEX_LUT[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+
+def _parse_hex(body, digits):
+    """Parse a body of '0x..,' cells with the given number of hex digits."""
+    raw = np.frombuffer(body.replace('\n', '').encode('ascii'), dtype=np.uint8)
+    cells = raw.reshape(-1, digits + 3)[:, 2:2 + digits]
+    values = np.zeros(len(cells), dtype=np.uint16)
+    for i in range(digits):
+        values = (values << 4) | _HEX_LUT[cells[:, i]]
+    return values
+
+def parse_header(header_filename):
+    """
+    Load the samples from a header written by the converters.
+
+    Handles decimal and hex int16 arrays, raw .bin includes and mu-law /
+    IMA-ADPCM encoded tracks (decoded with the reference decoders).
+    Returns a Track with int16 samples.
+    """
+    with open(header_filename, 'r') as f:
+        text = f.read()
+
+    defines = {kind: value for kind, (_, value) in header_defines(text).items()}
+    name = os.path.splitext(os.path.basename(header_filename))[0]
+    length = defines.get('LENGTH')
+    rate = defines.get('RATE', ISR_RATE)
+    channels = defines.get('CHANNELS', 1)
+    encoding = _ENCODING_NAMES[defines.get('ENCODING', 0)]
+
+    match = _ARRAY_RE.search(text)
+    bin_match = _BIN_RE.search(text)
+    if bin_match is not None:
+        bin_path = os.path.join(os.path.dirname(header_filename), bin_match.group(1))
+        data = np.fromfile(bin_path, dtype='<i2' if encoding == 'pcm16' else np.uint8)
+    elif match is not None:
+        ctype, _, body = match.groups()
+        if ctype == 'int16_t':
+            # without the trailing comma, which fromstring would read as an extra 0
+            data = np.fromstring(body.rstrip().rstrip(','), dtype=np.int32, sep=',').astype(np.int16)
+        elif ctype == 'uint16_t':
+            data = _parse_hex(body, 4).view(np.int16)
+        else:
+            data = _parse_hex(body, 2).astype(np.uint8)
+    else:
+        raise ValueError(f'No sample array found in {header_filename}')
+
+    if encoding != 'pcm16':
+        data = decode(data, encoding, length)
+    if length is not None:
+        data = data[:length]
+    return Track(name, np.ascontiguousarray(data, dtype=np.int16), rate, channels)
+
+def track_from_samples(name, samples, rate=ISR_RATE):
+    """Wrap converter output (int16 sequence) as a Track without going through a header."""
+    return Track(name, np.asarray(samples, dtype=np.int16).reshape(-1), rate, 1)
+
+def header_symbol(text):
+    """C name a sketch uses for a header's samples (the cast macro for hex/raw layouts, else the array)."""
+    match = _SYMBOL_RE.search(text) or _ARRAY_RE.search(text)
+    return match.group(2) if match.re is _ARRAY_RE else match.group(1)
+
+def header_defines(text):
+    """
+    {kind: (define name, value)} for a header's LENGTH/RATE/CHANNELS/ENCODING/BYTES defines.
+
+    Names are matched against the data symbol's stem (header_symbol without
+    _data, upper-cased): <STEM>_<KIND>, or the kind moved in at an '_' the way
+    older headers were renamed by hand (HIP_HOP_DRUM_LOOP_LENGTH_120_BPM for
+    hip_hop_drum_loop_120_bpm_data). A track whose own name contains RATE or
+    LENGTH is therefore never split at the wrong word.
+    """
+    names = dict(_AUDIO_DEFINES)
+    if _SYMBOL_RE.search(text) or _ARRAY_RE.search(text):
+        stem = header_symbol(text).upper()
+        if stem.endswith('_DATA'):
+            stem = stem[:-len('_DATA')]
+        # the plain <STEM>_<KIND> cut last, so it wins any clash
+        cuts = [i for i, c in enumerate(stem) if c == '_'] + [len(stem)]
+        for i in cuts:
+            for kind in _DEFINE_KINDS:
+                names[f'{stem[:i]}_{kind}{stem[i:]}'] = kind
+    defines = {}
+    for name, value in _NUMBER_DEFINE_RE.findall(text):
+        kind = names.get(name)
+        if kind is not None and kind not in defines:
+            defines[kind] = (name, int(value))
+    return defines
+
+def row_track_headers(row_dir):
+    """
+    A rowN_rp2040 folder's track headers in firmware track-id order.
+
+    The order comes from the sketch's track_pointers table when there is one,
+    otherwise the headers are taken alphabetically.
+    """
+    headers = sorted(glob.glob(os.path.join(row_dir, '*.h')))
+    for sketch in glob.glob(os.path.join(row_dir, '*.ino')):
+        with open(sketch, 'r') as f:
+            match = re.search(r'track_pointers\[\w*\]\s*=\s*\{([^}]*)\}', f.read())
+        if match is None:
+            continue
+        order = [p.strip() for p in match.group(1).split(',') if p.strip()]
+        by_symbol = {}
+        for header in headers:
+            with open(header, 'r') as f:
+                text = f.read()
+            if _SYMBOL_RE.search(text) or _ARRAY_RE.search(text):
+                by_symbol[header_symbol(text)] = header
+        if all(p in by_symbol for p in order):
+            return [by_symbol[p] for p in order]
+    return headers
+
+def load_row(row_dir):
+    """Load a rowN_rp2040 folder's tracks in firmware track-id order (see row_track_headers)."""
+    return [parse_header(h) for h in row_track_headers(row_dir)]
+
+def render_mix(tracks, n_samples, starts=None):
+    """
+    Render the mixer ISR output for tracks playing together.
+
+    Mirrors alarm_dt_handler: every ISR tick each playing track contributes
+    track[counter] / active (C integer division, truncating toward zero),
+    counters wrap at the track length, and the int32 sum is cast to int16.
+    Tracks start at output sample starts[i] (default 0), so `active` changes
+    as they come in, like pressing blocks one after another.
+
+    Returns:
+        (mix, stats) where mix is int16 and stats has 'wrapped' (samples the
+        int16 cast overflowed), 'full_scale' (samples at the int16 rails) and 'peak'.
+    """
+    if starts is None:
+        starts = [0] * len(tracks)
+    t = np.arange(n_samples)
+    active = np.zeros(n_samples, dtype=np.int32)
+    for start in starts:
+        active += t >= start
+
+    mixed = np.zeros(n_samples, dtype=np.int32)
+    for track, start in zip(tracks, starts):
+        samples = track.samples.astype(np.int32)
+        playing = t >= start
+        counter = (t[playing] - start) % len(samples)
+        value = samples[counter]
+        div = active[playing]
+        # int32 division in C truncates toward zero
+        mixed[playing] += np.sign(value) * (np.abs(value) // div)
+
+    mix = mixed.astype(np.int16)
+    stats = {
+        'wrapped': int(np.count_nonzero((mixed > 32767) | (mixed < -32768))),
+        'full_scale': int(np.count_nonzero((mix >= 32767) | (mix <= -32767))),
+        'peak': int(np.abs(mixed).max()) if n_samples else 0,
+    }
+    return mix, stats
+
+def write_wav(filename, samples, rate=ISR_RATE):
+    """Write mono int16 samples to a WAV."""
+    with wave.open(filename, 'wb') as wav_out:
+        wav_out.setnchannels(1)
+        wav_out.setsampwidth(2)
+        wav_out.setframerate(rate)
+        wav_out.writeframes(np.asarray(samples, dtype='<i2').tobytes())
+
+def render_all_combinations(tracks, n_samples, max_voices=N_SLOTS, output_dir=None):
+    """
+    Render every multiset of 1..max_voices tracks (the four slots can play the same track).
+
+    Returns a list of result dicts with the track ids, stats and a sha256 of
+    the rendered audio for regression checks; WAVs go to output_dir if given.
+    """
+    if output_dir is not None:
+        os.makedirs(output_dir, exist_ok=True)
+    results = []
+    for voices in range(1, max_voices + 1):
+        for combo in itertools.combinations_with_replacement(range(len(tracks)), voices):
+            mix, stats = render_mix([tracks[i] for i in combo], n_samples)
+            result = dict(ids=list(combo), names=[tracks[i].name for i in combo],
+                          sha256=hashlib.sha256(mix.tobytes()).hexdigest(), **stats)
+            if output_dir is not None:
+                result['wav'] = os.path.join(output_dir, 'mix_' + '_'.join(str(i + 1) for i in combo) + '.wav')
+                write_wav(result['wav'], mix)
+            results.append(result)
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render rowN_rp2040 mixes offline.')
+    parser.add_argument('inputs', nargs='+', help='row folder, or track headers to mix')
+    parser.add_argument('--seconds', type=float, default=4.0, help='length of each render')
+    parser.add_argument('--starts', type=float, nargs='*', help='start time (s) of each track')
+    parser.add_argument('-o', '--output', default='mix.wav', help='output WAV (or folder with --all)')
+    parser.add_argument('--all', action='store_true', help='render every combination of up to 4 tracks')
+    parser.add_argument('--json', help='write the per-mix stats/hashes here')
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if len(args.inputs) == 1 and os.path.isdir(args.inputs[0]):
+        tracks = load_row(args.inputs[0])
+    else:
+        tracks = [parse_header(h) for h in args.inputs]
+    t_parse = time.perf_counter() - t0
+    print(f'Loaded {len(tracks)} track(s) in {t_parse * 1000:.0f} ms')
+    for i, track in enumerate(tracks):
+        print(f'  {i + 1}: {track.name} ({len(track.samples)} samples, {track.rate} Hz)')
+
+    n_samples = int(args.seconds * ISR_RATE)
+    t0 = time.perf_counter()
+    if args.all:
+        results = render_all_combinations(tracks, n_samples, output_dir=args.output)
+    else:
+        starts = [int(s * ISR_RATE) for s in args.starts] if args.starts else None
+        mix, stats = render_mix(tracks, n_samples, starts)
+        write_wav(args.output, mix)
+        results = [dict(names=[t.name for t in tracks], wav=args.output,
+                        sha256=hashlib.sha256(mix.tobytes()).hexdigest(), **stats)]
+    elapsed = time.perf_counter() - t0
+
+    for result in results:
+        flag = '⚠' if result['wrapped'] or result['full_scale'] else '✓'
+        print(f"{flag} {' + '.join(result['names'])}: peak {result['peak']}, "
+              f"full-scale {result['full_scale']}, wrapped {result['wrapped']}")
+    rendered = len(results) * n_samples
+    print(f'Rendered {len(results)} mix(es), {rendered:,} samples in {elapsed:.2f}s '
+          f'({rendered / max(elapsed, 1e-9) / 1e6:.1f} M samples/s)')
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=1)
@@ -0,0 +1,91 @@
+from fractions import Fraction
+from functools import lru_cache
+import numpy as np
+from scipy import signal
+
+# (half_taps, kaiser beta): filter half-length in input periods of the slower rate, and stopband shape
+QUALITY = {
+    'fast': (8, 5.0),
+    'default': (16, 8.0),
+    'best': (32, 10.0),
+}
+MAX_DENOMINATOR = 5000   # up/down are kept at or below this; see rational_ratio
+FILTER_CACHE_SIZE = 32   # designed filters kept per process (least recently used dropped first)
+
+def rational_ratio(original_rate, target_rate, max_denominator=MAX_DENOMINATOR):
+    """
+    target_rate / original_rate as a Fraction with a small numerator and denominator.
+
+    Exact when it already is (22050/44100 -> 1/2); otherwise the closest
+    fraction with denominator <= max_denominator, e.g. 8537/44100 becomes
+    911/4706 (0.00005% slow, far below an audible pitch change). The
+    polyphase filter has max(up, down) phases, so this bounds its size.
+    Ratios within about 1/max_denominator of unity (22050 -> 22048) come
+    out as exactly 1, which design_filter turns into a pass-through.
+    """
+    ratio = Fraction(int(target_rate), int(original_rate))
+    if max(ratio.numerator, ratio.denominator) <= max_denominator:
+        return ratio
+    approx = ratio.limit_denominator(max_denominator)
+    while approx.numerator > max_denominator:
+        max_denominator //= 2
+        approx = ratio.limit_denominator(max_denominator)
+    return approx
+
+@lru_cache(maxsize=FILTER_CACHE_SIZE)
+def design_filter(up, down, half_taps=16, beta=8.0):
+    """
+    Kaiser-windowed low-pass for resampling by up/down, scaled by up.
+
+    Cut off at the lower of the two Nyquist frequencies in the upsampled
+    domain, 2 * half_taps * max(up, down) + 1 taps. Cached per ratio and
+    quality, so a batch that keeps hitting 44100 -> 22050 designs it once;
+    the returned array is read-only because it is shared. up == down has
+    nothing to band-limit (firwin would need a cutoff of 1.0), so the
+    filter is a single unit tap and the samples pass through unchanged.
+    """
+    max_rate = max(up, down)
+    if up == down:
+        h = np.ones(1)
+        h.flags.writeable = False
+        return h
+    h = signal.firwin(2 * half_taps * max_rate + 1, 1.0 / max_rate, window=('kaiser', beta)) * up
+    h.flags.writeable = False
+    return h
+
+def resample_poly(frames, original_rate, target_rate, n_out=None, quality='default'):
+    """
+    Polyphase-resample (frames, channels) audio; all channels go through one upfirdn call.
+
+    Args:
+        frames: (frames, channels) or 1-D array
+        original_rate, target_rate: Rates in Hz; the ratio goes through rational_ratio
+        n_out: Output length (default frames * target_rate // original_rate);
+               the tail is zero-padded when the rounded ratio falls just short
+        quality: Key of QUALITY
+
+    Returns float64 samples, centred like the input (the filter delay is
+    removed). The signal is treated as silent outside its ends, so the end
+    of a one-shot doesn't wrap into its attack the way an FFT resample does.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    n_in = len(frames)
+    if n_out is None:
+        n_out = n_in * int(target_rate) // int(original_rate)
+    ratio = rational_ratio(original_rate, target_rate)
+    up, down = ratio.numerator, ratio.denominator
+    h = design_filter(up, down, *QUALITY[quality])
+
+    # Pre-pad the filter so its centre lands on an output sample, then drop
+    # the outputs that only cover that padding
+    half_len = (len(h) - 1) // 2
+    n_pre = -half_len % down
+    n_skip = (half_len + n_pre) // down
+    if n_pre:
+        h = np.concatenate([np.zeros(n_pre), h])
+    # Enough trailing silence for the last output's filter window
+    n_need = -(-(n_out + n_skip) * down // up) + 1
+    pad = max(0, n_need - n_in)
+    if pad:
+        frames = np.concatenate([frames, np.zeros((pad,) + frames.shape[1:])])
+    return signal.upfirdn(h, frames, up, down, axis=0)[n_skip:n_skip + n_out]
@@ -0,0 +1,141 @@
+import os
+import re
+import math
+import argparse
+import numpy as np
+from render_mix import parse_header, header_symbol, header_defines, row_track_headers, N_SLOTS
+
+GAIN_SHIFT = 15  # gains are Q15: sample * gain >> GAIN_SHIFT
+
+_NAMES_RE = re.compile(r'track_names\[\w*\]\s*=\s*\{([^}]*)\}')
+
+def display_name(header_filename):
+    """'Drum-groove-120-bpm.h' -> 'Drum groove 120 bpm'."""
+    return os.path.splitext(os.path.basename(header_filename))[0].replace('-', ' ').replace('_', ' ')
+
+def sketch_track_names(row_dir):
+    """The track_names strings from a row's sketch, or None."""
+    for name in sorted(os.listdir(row_dir)):
+        if name.endswith('.ino'):
+            with open(os.path.join(row_dir, name), 'r') as f:
+                match = _NAMES_RE.search(f.read())
+            if match:
+                return re.findall(r'"([^"]*)"', match.group(1))
+    return None
+
+def track_stats(samples):
+    """Peak |sample|, headroom in dB and whole bits of headroom for int16 samples."""
+    peak = int(np.abs(samples.astype(np.int32)).max()) if len(samples) else 0
+    if peak == 0:
+        return 0, float('inf'), 15
+    headroom_db = 20 * math.log10(32767 / peak)
+    headroom_bits = int(math.floor(math.log2(32767 / peak)))
+    return peak, headroom_db, headroom_bits
+
+def mix_gains(peaks, normalize=False, n_slots=N_SLOTS):
+    """
+    Q15 gain for every (track, number of active voices).
+
+    gain[t][active] = track_gain[t] / active, so the ISR computes
+    sample * gain >> 15 instead of sample / active. track_gain is 1.0, or
+    with normalize the makeup gain that brings the track's peak to full
+    scale (so sample * gain always fits in an int32).
+    """
+    gains = np.zeros((len(peaks), n_slots + 1), dtype=np.int64)
+    for t, peak in enumerate(peaks):
+        track_gain = 32767 / peak if normalize and peak else 1.0
+        for active in range(1, n_slots + 1):
+            gains[t, active] = int(round(track_gain * (1 << GAIN_SHIFT) / active))
+    return gains
+
+def write_row_bank_header(bank_filename, headers, names=None, normalize=False, prefix='row'):
+    """
+    Write an ISR-ready table header for one row's tracks.
+
+    Args:
+        bank_filename: Output header (e.g. row1_rp2040/row_bank.h)
+        headers: Track headers in track-id order (pcm16, as written by the converters)
+        names: Display names (default: from the file names)
+        normalize: Fold a per-track makeup gain into the mix gains
+        prefix: Prefix for the generated C names
+
+    The table uses the symbols and LENGTH/RATE defines found in each track
+    header, so the sketch no longer keeps hand-written copies. Returns a list
+    of per-track dicts with the metadata that was written.
+    """
+    names = names or [display_name(h) for h in headers]
+    if len(names) != len(headers):
+        raise ValueError(f'{len(names)} names for {len(headers)} tracks')
+    bank_dir = os.path.dirname(os.path.abspath(bank_filename))
+
+    tracks = []
+    for header, name in zip(headers, names):
+        with open(header, 'r') as f:
+            text = f.read()
+        defines = header_defines(text)
+        if defines.get('ENCODING', (None, 0))[1] != 0:
+            raise ValueError(f'{header}: only pcm16 tracks can go into the mix tables')
+        track = parse_header(header)
+        peak, headroom_db, headroom_bits = track_stats(track.samples)
+        tracks.append(dict(header=os.path.relpath(os.path.abspath(header), bank_dir), name=name,
+                           symbol=header_symbol(text), length=len(track.samples), rate=track.rate,
+                           length_define=defines.get('LENGTH', (None,))[0],
+                           rate_define=defines.get('RATE', (None,))[0],
+                           peak=peak, headroom_db=headroom_db, headroom_bits=headroom_bits))
+    gains = mix_gains([t['peak'] for t in tracks], normalize)
+
+    P = prefix.upper()
+    guard = f'{P}_BANK_H'
+    n = len(tracks)
+    with open(bank_filename, 'w') as f:
+        f.write(f'#ifndef {guard}\n#define {guard}\n\n')
+        f.write('// Generated by row_bank.py - regenerate instead of editing\n')
+        for t in tracks:
+            f.write(f'#include "{t["header"]}"\n')
+        f.write('\n')
+        f.write(f'#define {P}_N_TRACKS {n}\n')
+        f.write(f'#define {P}_GAIN_SHIFT {GAIN_SHIFT}\n\n')
+
+        f.write(f'static const int16_t* const {prefix}_track_pointers[{P}_N_TRACKS] = {{'
+                + ', '.join(t['symbol'] for t in tracks) + '};\n')
+        f.write(f'static const int32_t {prefix}_track_lengths[{P}_N_TRACKS] = {{'
+                + ', '.join(t['length_define'] or str(t['length']) for t in tracks) + '};\n')
+        f.write(f'static const uint32_t {prefix}_track_rates[{P}_N_TRACKS] = {{'
+                + ', '.join(t['rate_define'] or str(t['rate']) for t in tracks) + '};\n')
+        f.write(f'static const char* const {prefix}_track_names[{P}_N_TRACKS] = {{'
+                + ', '.join(f'"{t["name"]}"' for t in tracks) + '};\n\n')
+
+        f.write('// peak |sample| and headroom to full scale (whole bits = safe left shift)\n')
+        f.write(f'static const int16_t {prefix}_track_peaks[{P}_N_TRACKS] = {{'
+                + ', '.join(str(t['peak']) for t in tracks) + '};\n')
+        f.write(f'static const uint8_t {prefix}_track_headroom_bits[{P}_N_TRACKS] = {{'
+                + ', '.join(str(t['headroom_bits']) for t in tracks) + '};\n')
+        f.write('// headroom dB: ' + ', '.join(f'{t["headroom_db"]:.1f}' for t in tracks) + '\n\n')
+
+        gain_note = 'makeup gain to full scale / active' if normalize else '1 / active'
+        f.write(f'// Q{GAIN_SHIFT} mix gains [track][active] = {gain_note}; in the ISR use\n')
+        f.write(f'//   mixed += ((int32_t)sample * {prefix}_mix_gain[id][active]) >> {P}_GAIN_SHIFT;\n')
+        f.write(f'// instead of sample / active (index 0 is unused)\n')
+        f.write(f'static const int32_t {prefix}_mix_gain[{P}_N_TRACKS][{N_SLOTS + 1}] = {{\n')
+        for t, row in zip(tracks, gains):
+            f.write('  {' + ', '.join(str(int(g)) for g in row) + f'}},  // {t["name"]}\n')
+        f.write('};\n\n')
+        f.write(f'#endif // {guard}\n')
+    return tracks
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate the track/gain table header for a row sketch.')
+    parser.add_argument('row_dir', help='rowN_rp2040 folder (tracks in track_pointers order)')
+    parser.add_argument('-o', '--output', help='output header (default: <row_dir>/row_bank.h)')
+    parser.add_argument('--names', nargs='*', help='display names (default: the sketch\'s track_names)')
+    parser.add_argument('--normalize', action='store_true', help='fold per-track makeup gain into the mix gains')
+    args = parser.parse_args()
+
+    headers = [h for h in row_track_headers(args.row_dir) if os.path.basename(h) != 'row_bank.h']
+    output = args.output or os.path.join(args.row_dir, 'row_bank.h')
+    names = args.names or sketch_track_names(args.row_dir)
+    tracks = write_row_bank_header(output, headers, names, args.normalize)
+    print(f'✓ Wrote {output}')
+    for i, t in enumerate(tracks):
+        print(f'  {i}: {t["name"]}: {t["length"]} samples, {t["rate"]} Hz, peak {t["peak"]} '
+              f'({t["headroom_db"]:.1f} dB headroom)')
@@ -0,0 +1,228 @@
+import os
+import sys
+import zlib
+import struct
+import argparse
+from collections import namedtuple
+import numpy as np
+from sample_codecs import ENCODINGS, ENCODING_IDS, encoded_size, encode, decode
+from wav_reader import open_wav
+
+# One bank file replaces the four WAVs littlefs_rp2040.ino opens:
+#
+#   header  : magic 'SBNK', u16 version, u16 n_tracks, u32 align, u16 buffer_samples, u16 reserved
+#   index   : n_tracks entries of INDEX_ENTRY (below), right after the header
+#   payloads: one per track, each starting on an `align` boundary and zero-padded
+#             to a whole number of refill buffers
+#
+# All fields are little-endian. With align a multiple of both the flash block and
+# the refill buffer, every BUFFER_SAMPLES read lands inside a single flash block.
+BANK_MAGIC = b'SBNK'
+BANK_VERSION = 1
+BUFFER_SAMPLES = 512    # BUFFER_SIZE in littlefs_rp2040.ino
+FLASH_BLOCK = 4096      # LittleFS block / RP2040 flash erase sector
+NAME_BYTES = 24
+
+BANK_HEADER = struct.Struct('<4sHHIHH')
+# offset, n_samples, n_bytes, rate, crc32, encoding, channels, reserved, name
+INDEX_ENTRY = struct.Struct(f'<IIIIIBBH{NAME_BYTES}s')
+
+BankTrack = namedtuple('BankTrack', ['name', 'offset', 'n_samples', 'n_bytes', 'rate', 'channels',
+                                     'encoding', 'crc32'])
+
+def _align_up(value, align):
+    return -(-value // align) * align
+
+def load_track(path):
+    """Read a converted track (WAV or generated header) as (name, int16 samples, rate, channels)."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    if path.lower().endswith('.h'):
+        from render_mix import parse_header
+        track = parse_header(path)
+        return name, track.samples, track.rate, track.channels
+    with open_wav(path) as wav:
+        samples = wav.read_array(wav.getnframes()).reshape(-1)
+        return name, samples, wav.getframerate(), wav.getnchannels()
+
+def build_bank(inputs, bank_filename, encoding='pcm16', align=FLASH_BLOCK, buffer_samples=BUFFER_SAMPLES,
+               flash_block=FLASH_BLOCK):
+    """
+    Pack converted tracks into a single indexed bank file.
+
+    Args:
+        inputs: Track paths (WAV or generated .h), in track-id order
+        bank_filename: Output path
+        encoding: 'pcm16' (raw little-endian int16) or one of the sample_codecs encodings
+        align: Payload alignment in bytes; must be a multiple of the flash block
+               and the refill buffer, as validate_bank requires
+        buffer_samples: Samples per firmware refill (payloads are padded to whole buffers)
+        flash_block: Flash erase block size in bytes
+
+    Returns:
+        List of BankTrack describing the index that was written.
+    """
+    if encoding not in ENCODINGS:
+        raise ValueError(f'Unknown encoding: {encoding}')
+    buffer_bytes = buffer_samples * 2
+    if align <= 0 or align % flash_block or align % buffer_bytes:
+        raise ValueError(f'align ({align}) must be a multiple of the flash block ({flash_block} bytes) '
+                         f'and refill buffer ({buffer_bytes} bytes)')
+
+    payloads = []
+    for path in inputs:
+        name, samples, rate, channels = load_track(path)
+        if encoding == 'ima_adpcm' and channels != 1:
+            raise ValueError(f'{path}: IMA-ADPCM tracks must be mono')
+        data = np.ascontiguousarray(encode(samples, encoding), dtype='<i2' if encoding == 'pcm16' else np.uint8)
+        payloads.append((name, data.tobytes(), len(samples), rate, channels))
+
+    offset = _align_up(BANK_HEADER.size + INDEX_ENTRY.size * len(payloads), align)
+    tracks = []
+    for name, data, n_samples, rate, channels in payloads:
+        tracks.append(BankTrack(name, offset, n_samples, len(data), rate, channels, encoding, zlib.crc32(data)))
+        offset = _align_up(offset + _align_up(len(data), buffer_bytes), align)
+
+    tmp_filename = bank_filename + '.tmp'
+    with open(tmp_filename, 'wb') as f:
+        f.write(BANK_HEADER.pack(BANK_MAGIC, BANK_VERSION, len(tracks), align, buffer_samples, 0))
+        for t in tracks:
+            f.write(INDEX_ENTRY.pack(t.offset, t.n_samples, t.n_bytes, t.rate, t.crc32, ENCODING_IDS[t.encoding],
+                                     t.channels, 0, t.name.encode('ascii', 'replace')[:NAME_BYTES - 1]))
+        for t, (_, data, _, _, _) in zip(tracks, payloads):
+            f.write(b'\0' * (t.offset - f.tell()))
+            f.write(data)
+        f.write(b'\0' * (offset - f.tell()))
+    os.replace(tmp_filename, bank_filename)
+    return tracks
+
+def read_bank_index(bank_filename):
+    """Return (align, buffer_samples, tracks) from a bank file's header and index."""
+    encoding_names = {v: k for k, v in ENCODING_IDS.items()}
+    with open(bank_filename, 'rb') as f:
+        magic, version, n_tracks, align, buffer_samples, _ = BANK_HEADER.unpack(f.read(BANK_HEADER.size))
+        if magic != BANK_MAGIC:
+            raise ValueError(f'{bank_filename}: not a sample bank (magic {magic!r})')
+        if version != BANK_VERSION:
+            raise ValueError(f'{bank_filename}: unsupported bank version {version}')
+        tracks = []
+        for _ in range(n_tracks):
+            offset, n_samples, n_bytes, rate, crc, enc, channels, _, name = INDEX_ENTRY.unpack(
+                f.read(INDEX_ENTRY.size))
+            tracks.append(BankTrack(name.rstrip(b'\0').decode('ascii'), offset, n_samples, n_bytes, rate,
+                                    channels, encoding_names.get(enc, f'unknown({enc})'), crc))
+    return align, buffer_samples, tracks
+
+def read_track(bank_filename, track):
+    """Decode one track (a BankTrack, index or name) from a bank to int16 samples."""
+    _, _, tracks = read_bank_index(bank_filename)
+    if isinstance(track, int):
+        track = tracks[track]
+    elif isinstance(track, str):
+        track = next(t for t in tracks if t.name == track)
+    with open(bank_filename, 'rb') as f:
+        f.seek(track.offset)
+        data = f.read(track.n_bytes)
+    if track.encoding == 'pcm16':
+        return np.frombuffer(data, dtype='<i2')[:track.n_samples]
+    return decode(np.frombuffer(data, dtype=np.uint8), track.encoding, track.n_samples)
+
+def validate_bank(bank_filename, flash_block=FLASH_BLOCK):
+    """
+    Check a bank's layout and payloads.
+
+    Returns a list of problems (empty when the bank is good): alignment to
+    the flash block and refill buffer, payloads inside the file and not
+    overlapping, byte counts matching the encoding, and payload CRCs.
+    """
+    try:
+        align, buffer_samples, tracks = read_bank_index(bank_filename)
+    except (ValueError, struct.error) as e:
+        return [str(e)]
+
+    problems = []
+    file_size = os.path.getsize(bank_filename)
+    buffer_bytes = buffer_samples * 2
+    if align % flash_block or align % buffer_bytes:
+        problems.append(f'align {align} is not a multiple of the flash block ({flash_block}) '
+                        f'and refill buffer ({buffer_bytes})')
+    index_end = BANK_HEADER.size + INDEX_ENTRY.size * len(tracks)
+    previous_end = index_end
+    with open(bank_filename, 'rb') as f:
+        for i, t in enumerate(tracks):
+            label = f'track {i} ({t.name})'
+            if t.encoding not in ENCODINGS:
+                problems.append(f'{label}: {t.encoding} encoding')
+                continue
+            if t.offset % align:
+                problems.append(f'{label}: offset {t.offset} not aligned to {align}')
+            if t.offset < previous_end:
+                problems.append(f'{label}: overlaps the index or the previous payload')
+            if t.offset + _align_up(t.n_bytes, buffer_bytes) > file_size:
+                problems.append(f'{label}: payload runs past the end of the file')
+                continue
+            if t.n_bytes != encoded_size(t.n_samples, t.encoding):
+                problems.append(f'{label}: {t.n_bytes} bytes does not match {t.n_samples} {t.encoding} samples')
+            f.seek(t.offset)
+            if zlib.crc32(f.read(t.n_bytes)) != t.crc32:
+                problems.append(f'{label}: CRC mismatch')
+            previous_end = t.offset + t.n_bytes
+    return problems
+
+def write_bank_header(header_filename, bank_filename, tracks):
+    """Write a C header with the bank layout structs and a track id per track for the firmware."""
+    guard = 'SAMPLE_BANK_H'
+    with open(header_filename, 'w') as f:
+        f.write(f'#ifndef {guard}\n#define {guard}\n\n')
+        f.write(f'// Layout of {os.path.basename(bank_filename)} (little-endian, see sample_bank.py)\n')
+        f.write(f'#define SAMPLE_BANK_FILE "/{os.path.basename(bank_filename)}"\n')
+        f.write(f'#define SAMPLE_BANK_VERSION {BANK_VERSION}\n\n')
+        f.write('struct __attribute__((packed)) SampleBankHeader {\n'
+                '  char magic[4];\n  uint16_t version;\n  uint16_t n_tracks;\n'
+                '  uint32_t align;\n  uint16_t buffer_samples;\n  uint16_t reserved;\n};\n\n')
+        f.write('struct __attribute__((packed)) SampleBankEntry {\n'
+                '  uint32_t offset;\n  uint32_t n_samples;\n  uint32_t n_bytes;\n  uint32_t rate;\n'
+                '  uint32_t crc32;\n  uint8_t encoding;\n  uint8_t channels;\n  uint16_t reserved;\n'
+                f'  char name[{NAME_BYTES}];\n}};\n\n')
+        for i, t in enumerate(tracks):
+            macro = t.name.upper().replace('-', '_').replace(' ', '_')
+            f.write(f'#define BANK_TRACK_{macro} {i}  // {t.n_samples} samples, {t.rate} Hz, {t.encoding}\n')
+        f.write(f'\n#endif // {guard}\n')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build, inspect or validate a LittleFS sample bank.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='pack converted tracks into a bank')
+    build.add_argument('bank')
+    build.add_argument('inputs', nargs='+', help='WAVs or generated headers, in track order')
+    build.add_argument('--encoding', choices=ENCODINGS, default='pcm16')
+    build.add_argument('--align', type=int, default=FLASH_BLOCK)
+    build.add_argument('--header', help='also write a C header describing the layout')
+    info = sub.add_parser('info', help='print a bank\'s index')
+    info.add_argument('bank')
+    check = sub.add_parser('validate', help='check alignment, bounds and CRCs')
+    check.add_argument('bank')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        try:
+            tracks = build_bank(args.inputs, args.bank, args.encoding, args.align)
+        except ValueError as e:
+            print(f'✗ {e}')
+            sys.exit(1)
+        print(f'✓ Wrote {args.bank} ({os.path.getsize(args.bank):,} bytes, {len(tracks)} tracks)')
+        if args.header:
+            write_bank_header(args.header, args.bank, tracks)
+            print(f'✓ Wrote {args.header}')
+    if args.command in ('build', 'info'):
+        align, buffer_samples, tracks = read_bank_index(args.bank)
+        print(f'  align {align}, refill buffer {buffer_samples} samples')
+        for i, t in enumerate(tracks):
+            print(f'  {i}: {t.name:24s} @{t.offset:<8d} {t.n_samples:8d} samples {t.rate:6d} Hz '
+                  f'{t.channels} ch {t.encoding}')
+    if args.command in ('build', 'validate'):
+        problems = validate_bank(args.bank)
+        for problem in problems:
+            print(f'✗ {problem}')
+        if problems:
+            sys.exit(1)
+        print(f'✓ {args.bank} is valid')
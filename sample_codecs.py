@@ -0,0 +1,207 @@
+import numpy as np
+
+ENCODINGS = ('pcm16', 'mulaw', 'ima_adpcm')
+
+# Numeric ids written to the headers as <VAR>_ENCODING
+ENCODING_IDS = {'pcm16': 0, 'mulaw': 1, 'ima_adpcm': 2}
+
+IMA_STEP_TABLE = np.array([
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767], dtype=np.int32)
+
+IMA_INDEX_TABLE = np.array([-1, -1, -1, -1, 2, 4, 6, 8,
+                            -1, -1, -1, -1, 2, 4, 6, 8], dtype=np.int32)
+
+# Block layout, same as the 256-byte mono blocks of IMA-ADPCM WAV files:
+#   int16 predictor (= first sample), uint8 step index, uint8 reserved,
+#   then (IMA_BLOCK_SAMPLES - 1) 4-bit codes, low nibble first.
+IMA_BLOCK_BYTES = 256
+IMA_HEADER_BYTES = 4
+IMA_BLOCK_SAMPLES = (IMA_BLOCK_BYTES - IMA_HEADER_BYTES) * 2 + 1  # 505
+
+MULAW_BIAS = 0x84
+MULAW_CLIP = 32635
+
+def encoded_size(num_samples, encoding):
+    """Number of bytes num_samples mono samples take in the given encoding."""
+    if encoding == 'pcm16':
+        return num_samples * 2
+    if encoding == 'mulaw':
+        return num_samples
+    if encoding == 'ima_adpcm':
+        return -(-num_samples // IMA_BLOCK_SAMPLES) * IMA_BLOCK_BYTES
+    raise ValueError(f'Unknown encoding: {encoding}')
+
+def mulaw_encode(samples):
+    """Encode int16 samples to 8-bit G.711 mu-law codes (uint8)."""
+    x = np.asarray(samples, dtype=np.int32)
+    sign = np.where(x < 0, 0x80, 0)
+    magnitude = np.minimum(np.abs(x), MULAW_CLIP) + MULAW_BIAS
+    # Segment = position of the highest set bit above bit 7
+    exponent = np.clip(np.floor(np.log2(magnitude)).astype(np.int32) - 7, 0, 7)
+    mantissa = (magnitude >> (exponent + 3)) & 0x0F
+    return (~(sign | (exponent << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+def mulaw_decode_table():
+    """int16 value for each of the 256 mu-law codes."""
+    codes = ~np.arange(256, dtype=np.int32) & 0xFF
+    exponent = (codes >> 4) & 0x07
+    mantissa = codes & 0x0F
+    magnitude = ((mantissa << 3) + MULAW_BIAS) << exponent
+    value = magnitude - MULAW_BIAS
+    return np.where(codes & 0x80, -value, value).astype(np.int16)
+
+def mulaw_decode(codes):
+    """Reference decoder: mu-law codes (uint8) back to int16 samples."""
+    return mulaw_decode_table()[np.asarray(codes, dtype=np.uint8)]
+
+def _initial_step_index(blocks):
+    """Pick a starting step index per block from the size of its first few differences."""
+    lead = np.abs(np.diff(blocks[:, :9].astype(np.int32), axis=1)).mean(axis=1)
+    return np.clip(np.searchsorted(IMA_STEP_TABLE, lead / 2), 0, 88).astype(np.int32)
+
+def ima_adpcm_encode(samples):
+    """
+    Encode mono int16 samples to IMA-ADPCM blocks.
+
+    All blocks are encoded side by side: each block starts from its own
+    header (first sample + step index), so the loop runs over the
+    IMA_BLOCK_SAMPLES positions within a block rather than over every sample.
+    The final block is padded with its last sample.
+
+    Returns:
+        uint8 array of len(blocks) * IMA_BLOCK_BYTES bytes
+    """
+    x = np.asarray(samples, dtype=np.int16).reshape(-1)
+    if len(x) == 0:
+        return np.zeros(0, dtype=np.uint8)
+    n_blocks = -(-len(x) // IMA_BLOCK_SAMPLES)
+    padded = np.empty(n_blocks * IMA_BLOCK_SAMPLES, dtype=np.int16)
+    padded[:len(x)] = x
+    padded[len(x):] = x[-1]
+    blocks = padded.reshape(n_blocks, IMA_BLOCK_SAMPLES)
+
+    predictor = blocks[:, 0].astype(np.int32)
+    index = _initial_step_index(blocks)
+    codes = np.empty((n_blocks, IMA_BLOCK_SAMPLES - 1), dtype=np.uint8)
+
+    header = np.zeros((n_blocks, IMA_HEADER_BYTES), dtype=np.uint8)
+    header[:, :2] = blocks[:, :1].astype('<i2').view(np.uint8)
+    header[:, 2] = index
+
+    for j in range(1, IMA_BLOCK_SAMPLES):
+        step = IMA_STEP_TABLE[index]
+        diff = blocks[:, j].astype(np.int32) - predictor
+        code = np.where(diff < 0, 8, 0)
+        diff = np.abs(diff)
+
+        vpdiff = step >> 3
+        bit = diff >= step
+        code |= bit * 4
+        diff -= bit * step
+        vpdiff += bit * step
+        half = step >> 1
+        bit = diff >= half
+        code |= bit * 2
+        diff -= bit * half
+        vpdiff += bit * half
+        quarter = step >> 2
+        bit = diff >= quarter
+        code |= bit
+        vpdiff += bit * quarter
+
+        predictor = np.clip(np.where(code & 8, predictor - vpdiff, predictor + vpdiff), -32768, 32767)
+        index = np.clip(index + IMA_INDEX_TABLE[code], 0, 88)
+        codes[:, j - 1] = code
+
+    packed = (codes[:, 0::2] | (codes[:, 1::2] << 4)).astype(np.uint8)
+    return np.hstack([header, packed]).reshape(-1)
+
+def ima_adpcm_decode(data, num_samples=None):
+    """
+    Reference decoder for ima_adpcm_encode output (mirrors what the firmware does).
+
+    Returns int16 samples, trimmed to num_samples if given.
+    """
+    blocks = np.asarray(data, dtype=np.uint8).reshape(-1, IMA_BLOCK_BYTES)
+    n_blocks = len(blocks)
+    predictor = blocks[:, :2].copy().view('<i2').reshape(-1).astype(np.int32)
+    index = blocks[:, 2].astype(np.int32)
+    packed = blocks[:, IMA_HEADER_BYTES:]
+    codes = np.empty((n_blocks, IMA_BLOCK_SAMPLES - 1), dtype=np.int32)
+    codes[:, 0::2] = packed & 0x0F
+    codes[:, 1::2] = packed >> 4
+
+    out = np.empty((n_blocks, IMA_BLOCK_SAMPLES), dtype=np.int16)
+    out[:, 0] = predictor
+    for j in range(1, IMA_BLOCK_SAMPLES):
+        code = codes[:, j - 1]
+        step = IMA_STEP_TABLE[index]
+        vpdiff = step >> 3
+        vpdiff += np.where(code & 4, step, 0)
+        vpdiff += np.where(code & 2, step >> 1, 0)
+        vpdiff += np.where(code & 1, step >> 2, 0)
+        predictor = np.clip(np.where(code & 8, predictor - vpdiff, predictor + vpdiff), -32768, 32767)
+        index = np.clip(index + IMA_INDEX_TABLE[code], 0, 88)
+        out[:, j] = predictor
+
+    out = out.reshape(-1)
+    return out if num_samples is None else out[:num_samples]
+
+def encode(samples, encoding):
+    """Encode int16 samples; returns uint8 bytes (or the int16 samples for pcm16)."""
+    if encoding == 'pcm16':
+        return np.asarray(samples, dtype=np.int16)
+    if encoding == 'mulaw':
+        return mulaw_encode(samples)
+    if encoding == 'ima_adpcm':
+        return ima_adpcm_encode(samples)
+    raise ValueError(f'Unknown encoding: {encoding}')
+
+def decode(data, encoding, num_samples=None):
+    """Reference decoder for encode()."""
+    if encoding == 'pcm16':
+        out = np.asarray(data, dtype=np.int16)
+    elif encoding == 'mulaw':
+        out = mulaw_decode(data)
+    elif encoding == 'ima_adpcm':
+        out = ima_adpcm_decode(data)
+    else:
+        raise ValueError(f'Unknown encoding: {encoding}')
+    return out if num_samples is None else out[:num_samples]
+
+def encode_stream(blocks, encoding):
+    """
+    Encode an iterable of int16 blocks, yielding encoded chunks as they fill.
+
+    IMA-ADPCM input is regrouped into whole ADPCM blocks so the result is the
+    same as encoding everything at once.
+    """
+    if encoding != 'ima_adpcm':
+        for block in blocks:
+            yield encode(np.asarray(block).reshape(-1), encoding)
+        return
+
+    pending = np.zeros(0, dtype=np.int16)
+    for block in blocks:
+        data = np.concatenate([pending, np.asarray(block, dtype=np.int16).reshape(-1)])
+        cut = len(data) - len(data) % IMA_BLOCK_SAMPLES
+        if cut:
+            yield ima_adpcm_encode(data[:cut])
+        pending = data[cut:]
+    if len(pending):
+        yield ima_adpcm_encode(pending)
+
+def snr_db(reference, decoded):
+    """Signal-to-noise ratio of decoded against reference, in dB."""
+    ref = np.asarray(reference, dtype=np.float64).reshape(-1)
+    err = ref - np.asarray(decoded, dtype=np.float64).reshape(-1)[:len(ref)]
+    noise = np.sum(err * err)
+    if noise == 0:
+        return float('inf')
+    return 10 * np.log10(np.sum(ref * ref) / noise)
@@ -0,0 +1,168 @@
+import wave
+import numpy as np
+from scipy import signal
+from resampler import rational_ratio, design_filter
+
+BLOCK_FRAMES = 64 * 1024  # frames read per block in the streaming paths
+
+def iter_frame_blocks(wav, block_frames=BLOCK_FRAMES, max_frames=None):
+    """
+    Yield int16 blocks of shape (frames, channels) from an open wave reader (16-bit, or a wav_reader.WavReader).
+
+    Stops after max_frames frames (None = read to the end), so truncated
+    conversions never read the tail of the file.
+    """
+    n_channels = wav.getnchannels()
+    remaining = wav.getnframes() if max_frames is None else min(max_frames, wav.getnframes())
+    while remaining > 0:
+        if hasattr(wav, 'read_array'):
+            block = wav.read_array(min(block_frames, remaining))
+        else:
+            block = np.frombuffer(wav.readframes(min(block_frames, remaining)), dtype='<i2').reshape(-1, n_channels)
+        if not len(block):
+            break
+        remaining -= len(block)
+        yield block
+
+def downmix_block(block):
+    """Average a (frames, 2) int16 block to (frames, 1), same rounding as convert_to_mono."""
+    mixed = (block[:, 0].astype(np.int32) + block[:, 1]) // 2
+    return mixed.astype(np.int16)[:, None]
+
+def to_int16(block):
+    """Round and clip a float block to int16."""
+    return np.clip(np.rint(block), -32768, 32767).astype(np.int16)
+
+class StreamingResampler:
+    """
+    Stateful polyphase resampler for audio arriving in blocks.
+
+    The rate ratio is reduced to up/down (resampler.rational_ratio) and the
+    shared Kaiser-windowed low-pass from resampler.design_filter is applied
+    with scipy's upfirdn, the same polyphase kernel resample_poly uses. Each
+    call to process() returns every output sample whose filter window is
+    fully covered by the input seen so far and keeps just enough input
+    history to continue seamlessly in the next block, so the result does not
+    depend on where the block boundaries fall. Working memory is a few
+    copies of the block, whatever the filter length.
+    flush() pads the end with silence and returns the remaining
+    floor(n_in * target_rate / original_rate) - n_out samples.
+    """
+
+    def __init__(self, original_rate, target_rate, n_channels=1, half_taps=16, beta=8.0):
+        ratio = rational_ratio(original_rate, target_rate)
+        self.up, self.down = ratio.numerator, ratio.denominator
+        self.original_rate, self.target_rate = int(original_rate), int(target_rate)
+        self.n_channels = n_channels
+
+        self.h = design_filter(self.up, self.down, half_taps, beta)
+        numtaps = len(self.h)
+        self.taps_per_phase = -(-numtaps // self.up)
+        self.delay = (numtaps - 1) // 2
+
+        # Input history; history[0] is global input index self.start (negative = leading silence)
+        k = self.taps_per_phase
+        self.history = np.zeros((k - 1, n_channels))
+        self.start = -(k - 1)
+        self.n_in = 0
+        self.n_out = 0
+
+    def _emit(self, buf, m_end):
+        """
+        Compute outputs self.n_out..m_end-1 from buf (global index self.start at row 0).
+
+        Output m is sum_j x[j] * h[m * down + delay - j * up]. upfirdn over
+        the rows those outputs reach, starting at global index s, puts its
+        output i at upsampled position i * down + s * up; prepending q zeros
+        to h shifts that by q so it lands on m * down + delay exactly.
+        """
+        k = self.taps_per_phase
+        if m_end <= self.n_out:
+            return np.zeros((0, self.n_channels))
+        first = max(0, (self.n_out * self.down + self.delay) // self.up - (k - 1) - self.start)
+        last = ((m_end - 1) * self.down + self.delay) // self.up - self.start
+        s = self.start + first
+        q = (s * self.up - self.delay) % self.down
+        h = np.concatenate([np.zeros(q), self.h]) if q else self.h
+        i0 = (self.n_out * self.down + self.delay + q - s * self.up) // self.down
+        out = signal.upfirdn(h, buf[first:last + 1], self.up, self.down, axis=0)[i0:i0 + m_end - self.n_out]
+        self.n_out = m_end
+        return out
+
+    def _advance(self, buf):
+        """Drop input rows no future output can reach."""
+        k = self.taps_per_phase
+        next_last = (self.n_out * self.down + self.delay) // self.up
+        keep_from = min(next_last - k + 1 - self.start, len(buf))
+        keep_from = max(keep_from, 0)
+        self.history = buf[keep_from:]
+        self.start += keep_from
+
+    def process(self, block):
+        """Feed a (frames, channels) block; returns the float outputs now available."""
+        buf = np.concatenate([self.history, np.asarray(block, dtype=np.float64)])
+        self.n_in += len(block)
+        # Outputs whose newest input index (pos // up) has already arrived, never past
+        # the real-rate total so far (up/down may be rounded, e.g. 22050 -> 22048 is 1/1)
+        m_end = min((self.n_in * self.up - 1 - self.delay) // self.down + 1,
+                    self.n_in * self.target_rate // self.original_rate)
+        m_end = max(self.n_out, m_end)
+        out = self._emit(buf, m_end)
+        self._advance(buf)
+        return out
+
+    def flush(self):
+        """Pad the end with silence and return the remaining outputs."""
+        total = self.n_in * self.target_rate // self.original_rate
+        if total <= self.n_out:
+            return np.zeros((0, self.n_channels))
+        pad = self.delay // self.up + self.taps_per_phase + 1
+        buf = np.concatenate([self.history, np.zeros((pad, self.n_channels))])
+        out = self._emit(buf, total)
+        self._advance(buf)
+        return out
+
+def stream_convert(wav, target_rate=None, mono=False, max_frames=None, block_frames=BLOCK_FRAMES):
+    """
+    Yield processed int16 blocks (frames, channels) from an open wave reader.
+
+    Reads at most max_frames source frames, downmixes to mono if requested and
+    resamples block by block, so memory stays bounded by block_frames no
+    matter how long the recording is.
+    """
+    framerate = wav.getframerate()
+    n_channels = 1 if mono else wav.getnchannels()
+    resampler = None
+    if target_rate is not None and target_rate != framerate:
+        resampler = StreamingResampler(framerate, target_rate, n_channels)
+
+    for block in iter_frame_blocks(wav, block_frames, max_frames):
+        if mono and block.shape[1] == 2:
+            block = downmix_block(block)
+        if resampler is None:
+            yield block
+        else:
+            out = resampler.process(block)
+            if len(out):
+                yield to_int16(out)
+
+    if resampler is not None:
+        out = resampler.flush()
+        if len(out):
+            yield to_int16(out)
+
+def stream_to_wav(blocks, output_file, n_channels, framerate, max_frames=None):
+    """Write int16 blocks to a 16-bit WAV as they arrive; returns the frames written."""
+    written = 0
+    with wave.open(output_file, 'wb') as wav_out:
+        wav_out.setnchannels(n_channels)
+        wav_out.setsampwidth(2)
+        wav_out.setframerate(framerate)
+        for block in blocks:
+            if max_frames is not None:
+                block = block[:max_frames - written]
+            wav_out.writeframes(np.ascontiguousarray(block, dtype='<i2').tobytes())
+            written += len(block)
+            if max_frames is not None and written >= max_frames:
+                break
+    return written
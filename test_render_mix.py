@@ -0,0 +1,35 @@
+import os
+from render_mix import parse_header, header_defines
+
+ROW1 = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'row1_rp2040')
+
+def test_parse_row1_header():
+    # Data ends in a trailing comma and the defines carry a _120_BPM suffix
+    track = parse_header(os.path.join(ROW1, '120-bpm-hip-hop-drum-loop.h'))
+    assert len(track.samples) == 34164
+    assert track.rate == 8541
+    assert track.channels == 1
+    assert track.samples[-1] == -290
+
+FIRST_RATE_LOOP = '''#ifndef FIRST_RATE_LOOP_H
+#define FIRST_RATE_LOOP_H
+
+// first_rate_loop: 5 samples, 1 ch, 11025 Hz
+const int16_t first_rate_loop_data[] PROGMEM = {
+  1, -2, 3, -4, 5,
+};
+#define FIRST_RATE_LOOP_LENGTH 5
+#define FIRST_RATE_LOOP_RATE 11025
+#define FIRST_RATE_LOOP_CHANNELS 1
+
+#endif // FIRST_RATE_LOOP_H
+'''
+
+def test_parse_name_containing_define_kind(tmp_path):
+    # RATE inside the track name must not be taken as the start of the define's kind
+    header = tmp_path / 'first-rate-loop.h'
+    header.write_text(FIRST_RATE_LOOP)
+    track = parse_header(str(header))
+    assert list(track.samples) == [1, -2, 3, -4, 5]
+    assert track.rate == 11025
+    assert header_defines(FIRST_RATE_LOOP)['LENGTH'] == ('FIRST_RATE_LOOP_LENGTH', 5)
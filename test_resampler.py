@@ -0,0 +1,20 @@
+import numpy as np
+from resampler import resample_poly
+from streaming import StreamingResampler
+
+def test_near_unity_ratio_passes_through():
+    # 22050 -> 22048 reduces to 1/1; the samples come through cut to n_out
+    frames = np.arange(-500, 500, dtype=np.int16).reshape(-1, 1)
+    n_out = len(frames) * 22048 // 22050
+    out = resample_poly(frames, 22050, 22048)
+    assert np.array_equal(out, frames[:n_out])
+
+    resampler = StreamingResampler(22050, 22048)
+    streamed = np.concatenate([resampler.process(frames[:300]), resampler.process(frames[300:]), resampler.flush()])
+    assert np.array_equal(streamed, frames[:n_out])
+
+def test_near_unity_ratio_pads_to_n_out():
+    frames = np.ones((10, 2))
+    out = resample_poly(frames, 22050, 22049, n_out=12)
+    assert out.shape == (12, 2)
+    assert np.array_equal(out[:10], frames) and not out[10:].any()
@@ -0,0 +1,25 @@
+from row_bank import write_row_bank_header
+
+FIRST_RATE_LOOP = '''#ifndef FIRST_RATE_LOOP_H
+#define FIRST_RATE_LOOP_H
+
+// first_rate_loop: 4 samples, 1 ch, 11025 Hz
+const int16_t first_rate_loop_data[] PROGMEM = {
+  100, -200, 300, -400,
+};
+#define FIRST_RATE_LOOP_LENGTH 4
+#define FIRST_RATE_LOOP_RATE 11025
+#define FIRST_RATE_LOOP_CHANNELS 1
+
+#endif // FIRST_RATE_LOOP_H
+'''
+
+def test_tables_use_the_tracks_own_defines(tmp_path):
+    # FIRST_RATE_LOOP_LENGTH also contains _RATE; it must not become the rate entry
+    header = tmp_path / 'first-rate-loop.h'
+    header.write_text(FIRST_RATE_LOOP)
+    tracks = write_row_bank_header(str(tmp_path / 'row_bank.h'), [str(header)])
+    assert tracks[0]['length_define'] == 'FIRST_RATE_LOOP_LENGTH'
+    assert tracks[0]['rate_define'] == 'FIRST_RATE_LOOP_RATE'
+    text = (tmp_path / 'row_bank.h').read_text()
+    assert 'row_track_rates[ROW_N_TRACKS] = {FIRST_RATE_LOOP_RATE}' in text
@@ -1,31 +1,61 @@
 import wave
 import sys
+import os
+from streaming import BLOCK_FRAMES
+from loop_trim import loop_cut_from_wav
+from wav_reader import open_wav
+from audio_stages import duration_frames
 
-def trim_wav(input_file, output_file=None, max_seconds=4.0):
-    """Trim WAV file to max_seconds duration."""
+def trim_wav(input_file, output_file=None, max_seconds=4.0, block_frames=BLOCK_FRAMES, bars=False):
+    """
+    Trim WAV file to max_seconds duration, copying block_frames frames at a time.
+    
+    Any format wav_reader handles is accepted; the output is 16-bit.
+    With bars=True the cut is the largest whole number of bars within
+    max_seconds (tempo from the file name or detected), ending on a clean seam.
+    """
     if output_file is None:
         base = input_file.rsplit('.', 1)[0]
         output_file = f'{base}_trimmed.wav'
     
-    with wave.open(input_file, 'rb') as wav_in:
+    with open_wav(input_file) as wav_in:
         params = wav_in.getparams()
         framerate = params.framerate
         n_channels = params.nchannels
-        max_frames = int(max_seconds * framerate)
+        max_frames = duration_frames(max_seconds, framerate, n_channels)
         
-        frames = wav_in.readframes(max_frames)
+        if bars:
+            name = os.path.splitext(os.path.basename(input_file))[0]
+            cut = loop_cut_from_wav(wav_in, min(max_frames, params.nframes), name)
+            if cut is None:
+                print(f'⚠ No tempo found in {input_file}, trimming to {max_seconds}s')
+            else:
+                max_frames = cut.frames
+                print(f'{cut.count} {cut.unit} at {cut.bpm:.1f} BPM ({cut.bpm_source})')
         
         with wave.open(output_file, 'wb') as wav_out:
             wav_out.setparams(params)
-            wav_out.writeframes(frames)
+            
+            # Copy in blocks so neither the kept part nor the tail is held in memory
+            n_bytes = 0
+            remaining = max_frames
+            while remaining > 0:
+                frames = wav_in.readframes(min(block_frames, remaining))
+                if not frames:
+                    break
+                wav_out.writeframes(frames)
+                n_bytes += len(frames)
+                remaining -= len(frames) // (n_channels * params.sampwidth)
     
-    duration = len(frames) / (framerate * n_channels * params.sampwidth)
+    duration = n_bytes / (framerate * n_channels * params.sampwidth)
     print(f'Trimmed {input_file} -> {output_file} ({duration:.2f}s)')
 
 if __name__ == '__main__':
-    if len(sys.argv) < 2:
-        print('Usage: python trim_wav.py <input.wav> [output.wav]')
+    bars = '--bars' in sys.argv[1:]
+    args = [a for a in sys.argv[1:] if a != '--bars']
+    if len(args) < 1:
+        print('Usage: python trim_wav.py [--bars] <input.wav> [output.wav]')
         sys.exit(1)
     
-    trim_wav(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    trim_wav(args[0], args[1] if len(args) > 1 else None, bars=bars)
 
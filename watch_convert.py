@@ -0,0 +1,298 @@
+import os
+import io
+import sys
+import time
+import shutil
+import asyncio
+import zipfile
+import argparse
+import tempfile
+import contextlib
+import struct
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from conversion_compressed import convert_wav_to_header
+from compress_wav import compress_wav
+from process_soundeffects import CONVERT_KWARGS, find_wav_member
+from build_cache import BuildCache
+from wav_reader import open_wav
+
+# Settings for 'header' rules, as in conversion_compressed.py's __main__
+HEADER_KWARGS = dict(
+    max_size_mb=2.0,
+    target_rate=22050,
+    max_duration_sec=4.0
+)
+
+POLL_SEC = 0.5     # how often the watched directories are scanned
+SETTLE_SEC = 1.0   # a file must keep the same size and mtime this long before it is converted
+
+# mode: 'header' (WAV -> .h), 'compress' (WAV -> _compressed.wav) or 'soundeffects' (zip -> .h)
+WatchRule = namedtuple('WatchRule', ['input_dir', 'mode', 'output_dir'])
+
+MODES = ('header', 'compress', 'soundeffects')
+
+DEFAULT_RULES = [
+    WatchRule('multi_sample/data', 'header', 'multi_sample'),
+    WatchRule('soundeffects', 'soundeffects', 'soundeffects_headers'),
+]
+
+def parse_rule(text):
+    """'DIR:MODE[:OUTPUT_DIR]' -> WatchRule (output defaults to DIR)."""
+    parts = text.split(':')
+    if len(parts) not in (2, 3) or parts[1] not in MODES:
+        raise argparse.ArgumentTypeError(f'expected DIR:MODE[:OUTPUT_DIR] with MODE one of {", ".join(MODES)}')
+    return WatchRule(parts[0], parts[1], parts[2] if len(parts) == 3 else parts[0])
+
+def _is_input(rule, name):
+    if name.startswith('.') or name.endswith('.tmp'):
+        return False
+    if rule.mode == 'soundeffects':
+        return name.lower().endswith('.zip')
+    if rule.mode == 'compress' and name.endswith('_compressed.wav'):
+        return False  # our own outputs when compressing in place
+    return name.lower().endswith('.wav')
+
+def scan(rule):
+    """{path: (size, mtime_ns)} for the inputs currently in rule.input_dir."""
+    found = {}
+    try:
+        entries = list(os.scandir(rule.input_dir))
+    except FileNotFoundError:
+        return found
+    for entry in entries:
+        if entry.is_file() and _is_input(rule, entry.name):
+            st = entry.stat()
+            found[entry.path] = (st.st_size, st.st_mtime_ns)
+    return found
+
+def is_complete(rule, path):
+    """
+    Whether an input that has stopped changing is also whole.
+
+    Copies and DAW exports can pause mid-write, so a settled file still has
+    to parse: a WAV needs every byte its data chunk announces, a zip needs
+    its central directory (written last) and a WAV member.
+    """
+    try:
+        if rule.mode == 'soundeffects':
+            with zipfile.ZipFile(path) as zip_ref:
+                return find_wav_member(zip_ref) is not None
+        with open_wav(path) as wav:
+            return wav.getnframes() > 0 and not wav.info.truncated
+    except (OSError, ValueError, struct.error, zipfile.BadZipFile):
+        return False
+
+def expected_outputs(rule, path):
+    """Outputs a rule produces for path (soundeffects names come from the zip member)."""
+    base = os.path.splitext(os.path.basename(path))[0]
+    if rule.mode == 'compress':
+        return [os.path.join(rule.output_dir, f'{base}_compressed.wav')]
+    if rule.mode == 'soundeffects':
+        try:
+            with zipfile.ZipFile(path) as zip_ref:
+                member = find_wav_member(zip_ref)
+        except (OSError, zipfile.BadZipFile):
+            return []
+        if member is None:
+            return []
+        base = os.path.splitext(os.path.basename(member))[0]
+    return [os.path.join(rule.output_dir, f'{base}.h')]
+
+def is_up_to_date(rule, path):
+    """True when every output exists and is newer than the input."""
+    outputs = expected_outputs(rule, path)
+    if not outputs:
+        return False
+    source_mtime = os.path.getmtime(path)
+    return all(os.path.exists(p) and os.path.getmtime(p) >= source_mtime for p in outputs)
+
+def _convert_into(rule, path, staging_dir, cache):
+    if rule.mode == 'compress':
+        name = os.path.splitext(os.path.basename(path))[0] + '_compressed.wav'
+        compress_wav(path, os.path.join(staging_dir, name), cache=cache)
+    elif rule.mode == 'header':
+        convert_wav_to_header(path, output_dir=staging_dir, cache=cache, **HEADER_KWARGS)
+    else:
+        with zipfile.ZipFile(path) as zip_ref:
+            with zip_ref.open(find_wav_member(zip_ref)) as wav_stream:
+                convert_wav_to_header(wav_stream, output_dir=staging_dir, cache=cache, **CONVERT_KWARGS)
+
+def convert_job(rule, path, cache=None):
+    """
+    Convert one input and publish its outputs atomically.
+
+    The converter writes into a staging directory inside rule.output_dir, and
+    the finished files are moved over the old ones with os.replace, so the
+    firmware build never sees a half-written header (.h goes last so it never
+    refers to a missing .bin). Runs in a worker process; progress output is
+    captured and returned. Returns (path, outputs, log, error).
+    """
+    log = io.StringIO()
+    os.makedirs(rule.output_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(prefix='.watch-', dir=rule.output_dir)
+    try:
+        with contextlib.redirect_stdout(log):
+            _convert_into(rule, path, staging_dir, cache)
+        names = sorted(os.listdir(staging_dir), key=lambda name: name.endswith('.h'))
+        outputs = []
+        for name in names:
+            target = os.path.join(rule.output_dir, name)
+            os.replace(os.path.join(staging_dir, name), target)
+            outputs.append(target)
+        return path, outputs, log.getvalue(), None
+    except Exception as e:
+        return path, [], log.getvalue(), f'{type(e).__name__}: {e}'
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+class Watcher:
+    """
+    Poll input directories and convert new or changed files.
+
+    A file is converted once its size and mtime have held still for settle
+    seconds and it parses as complete; a settled file that does not parse is
+    reported once and left alone until it changes again. At most `workers`
+    conversions run at once; files that change while waiting or converting
+    are picked up again with their latest contents, so a burst of saves
+    costs one conversion per file rather than one per save.
+    """
+
+    def __init__(self, rules, workers=2, interval=POLL_SEC, settle=SETTLE_SEC, cache=None):
+        self.rules = rules
+        self.workers = max(1, workers)
+        self.interval = interval
+        self.settle = settle
+        self.cache = cache
+        self.seen = {}        # path -> signature last observed
+        self.changed_at = {}  # path -> monotonic time the signature last changed
+        self.done = {}        # path -> signature last converted (or found up to date)
+        self.incomplete = {}  # path -> signature that settled but did not parse as complete
+        self.running = set()
+        self.converted = 0
+        self.failed = 0
+
+    def _prime(self):
+        """Mark inputs whose outputs are already newer than them as done."""
+        stale = 0
+        for rule in self.rules:
+            for path, signature in scan(rule).items():
+                self.seen[path] = signature
+                self.changed_at[path] = float('-inf')
+                if is_up_to_date(rule, path):
+                    self.done[path] = signature
+                else:
+                    stale += 1
+        return stale
+
+    def _pending(self, now):
+        """(rule, path, signature) for inputs that changed and have settled; refreshes the bookkeeping."""
+        ready = []
+        for rule in self.rules:
+            current = scan(rule)
+            for path in [p for p in self.seen if os.path.dirname(p) == rule.input_dir.rstrip(os.sep)
+                         and p not in current]:
+                print(f'⚠ {path} removed (outputs kept)')
+                for table in (self.seen, self.changed_at, self.done, self.incomplete):
+                    table.pop(path, None)
+            for path, signature in current.items():
+                if self.seen.get(path) != signature:
+                    self.seen[path] = signature
+                    self.changed_at[path] = now
+                if self.done.get(path) == signature or self.incomplete.get(path) == signature \
+                        or path in self.running:
+                    continue
+                if now - self.changed_at[path] >= self.settle:
+                    ready.append((rule, path, signature))
+        return ready
+
+    async def _convert(self, pool, rule, path, signature):
+        loop = asyncio.get_running_loop()
+        started = self.changed_at[path]
+        try:
+            if not await loop.run_in_executor(pool, is_complete, rule, path):
+                # Truncated or still being written: skipped until its size or mtime changes
+                self.incomplete[path] = signature
+                print(f'⚠ {path} is incomplete (truncated or missing its WAV data), '
+                      f'waiting for it to change\n')
+                return
+            self.incomplete.pop(path, None)
+            print(f'→ {path} changed, converting...')
+            path, outputs, log, error = await loop.run_in_executor(pool, convert_job, rule, path, self.cache)
+            print(log, end='')
+            # Recorded even on failure so a broken file isn't retried until it changes
+            self.done[path] = signature
+            if error is not None:
+                self.failed += 1
+                print(f'✗ {path}: {error}\n')
+            else:
+                self.converted += 1
+                latency = f', {time.monotonic() - started:.1f}s after the last write' if started > 0 else ''
+                print(f'✓ Updated {", ".join(outputs)}{latency}\n')
+        finally:
+            self.running.discard(path)
+
+    def summary(self):
+        """'Converted N, failed N' plus any inputs left incomplete."""
+        text = f'Converted {self.converted}, failed {self.failed}'
+        if self.incomplete:
+            text += f', incomplete {len(self.incomplete)} ({", ".join(sorted(self.incomplete))})'
+        return text
+
+    async def run(self, once=False):
+        """
+        Watch until cancelled (Ctrl-C), or with once=True until every stale
+        input has been converted or found incomplete.
+
+        Returns True when nothing failed and nothing is left incomplete.
+        """
+        stale = self._prime()
+        for rule in self.rules:
+            print(f'Watching {rule.input_dir} ({rule.mode} -> {rule.output_dir})')
+        print(f'  {len(self.seen)} input(s), {stale} need converting, {self.workers} worker(s)\n')
+
+        tasks = set()
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                ready = self._pending(time.monotonic())
+                for rule, path, signature in ready[:self.workers - len(self.running)]:
+                    self.running.add(path)
+                    task = asyncio.create_task(self._convert(pool, rule, path, signature))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                if once and not ready and not self.running:
+                    break
+                await asyncio.sleep(self.interval)
+        print(self.summary())
+        return not self.failed and not self.incomplete
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Watch input folders and convert WAVs/zips as they are saved.')
+    parser.add_argument('--watch', action='append', type=parse_rule, metavar='DIR:MODE[:OUTPUT_DIR]',
+                        help=f'folder to watch, MODE one of {", ".join(MODES)} (repeatable; default: '
+                             + ', '.join(f'{r.input_dir}:{r.mode}:{r.output_dir}' for r in DEFAULT_RULES) + ')')
+    parser.add_argument('-j', '--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help='conversions run at once (default: half the CPUs)')
+    parser.add_argument('--interval', type=float, default=POLL_SEC, help='seconds between scans')
+    parser.add_argument('--settle', type=float, default=SETTLE_SEC,
+                        help='seconds a file must stay unchanged before it is converted')
+    parser.add_argument('--once', action='store_true',
+                        help='convert whatever is stale, then exit (status 1 if any input failed or is incomplete)')
+    parser.add_argument('--no-cache', action='store_true', help='do not use the build cache')
+    args = parser.parse_args()
+
+    rules = args.watch or DEFAULT_RULES
+    missing = [r.input_dir for r in rules if not os.path.isdir(r.input_dir)]
+    for input_dir in missing:
+        print(f'⚠ Directory not found: {input_dir} (watching for it to appear)')
+    if len(missing) == len(rules) and args.once:
+        sys.exit(1)
+
+    watcher = Watcher(rules, args.workers, args.interval, args.settle, None if args.no_cache else BuildCache())
+    try:
+        ok = asyncio.run(watcher.run(once=args.once))
+    except KeyboardInterrupt:
+        print(f'\nStopped. {watcher.summary()}')
+        ok = True
+    if args.once and not ok:
+        sys.exit(1)
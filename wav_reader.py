@@ -0,0 +1,326 @@
+import os
+import sys
+import mmap
+import struct
+from collections import namedtuple
+import numpy as np
+
+# Reads the WAVs the stdlib wave module refuses (8/24/32-bit integer, 32/64-bit
+# float, WAVE_FORMAT_EXTENSIBLE) and hands every format to the converters as
+# int16. Path sources are memory-mapped and 16-bit data is returned as views of
+# the mapping, so loading a file no longer copies it; other streams (zip
+# members) are read frame range by frame range.
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+LEGACY_DATA_OFFSET = 44  # where littlefs_rp2040.ino seeks to, assuming a bare fmt + data header
+STREAM_READ_BYTES = 1024 * 1024  # largest single read when skipping through a stream source
+
+# Chunk payload position within the file
+Chunk = namedtuple('Chunk', ['id', 'offset', 'size'])
+
+# Source format; sample_width is the source container size in bytes. truncated
+# means the data chunk announces more bytes than the file holds (still being written).
+WavInfo = namedtuple('WavInfo', ['format_tag', 'n_channels', 'framerate', 'sample_width', 'bits', 'n_frames',
+                                 'data_offset', 'data_size', 'chunks', 'truncated'])
+
+# Same fields as wave's getparams(), so wave_out.setparams() accepts it
+WavParams = namedtuple('WavParams', ['nchannels', 'sampwidth', 'framerate', 'nframes', 'comptype', 'compname'])
+
+_SOURCE_DTYPES = {
+    (WAVE_FORMAT_PCM, 1): np.uint8,
+    (WAVE_FORMAT_PCM, 2): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 3): np.uint8,      # 3 bytes per sample, assembled in _to_int16
+    (WAVE_FORMAT_PCM, 4): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 4): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 8): np.dtype('<f8'),
+}
+
+def describe(info):
+    """'16-bit PCM', '24-bit PCM', '32-bit float', ..."""
+    kind = 'float' if info.format_tag == WAVE_FORMAT_IEEE_FLOAT else 'PCM'
+    return f'{info.bits}-bit {kind}'
+
+def parse_chunks(buf):
+    """
+    Parse the RIFF/WAVE chunk list of buf (bytes-like).
+
+    Returns a WavInfo. Only the fmt and data chunks are interpreted; every
+    chunk's payload offset and size is listed in .chunks.
+    """
+    if len(buf) < 12 or bytes(buf[0:4]) != b'RIFF' or bytes(buf[8:12]) != b'WAVE':
+        raise ValueError('Not a RIFF/WAVE file')
+    chunks = []
+    fmt = data = None
+    pos = 12
+    while pos + 8 <= len(buf):
+        chunk_id, size = struct.unpack_from('<4sI', buf, pos)
+        chunk = Chunk(chunk_id.decode('latin-1'), pos + 8, size)
+        chunks.append(chunk)
+        if chunk.id == 'fmt ':
+            fmt = bytes(buf[chunk.offset:chunk.offset + size])
+        elif chunk.id == 'data':
+            data = chunk
+            if chunk.offset + size > len(buf):
+                break
+        pos = chunk.offset + size + (size & 1)  # chunks are padded to even sizes
+    available = 0 if data is None else max(0, min(data.size, len(buf) - data.offset))
+    return _format_info(fmt, data, chunks, available)
+
+def _format_info(fmt, data, chunks, available):
+    """WavInfo from a fmt chunk payload, the data Chunk and the data bytes actually present."""
+    if fmt is None or len(fmt) < 16:
+        raise ValueError('WAV has no fmt chunk')
+    if data is None:
+        raise ValueError('WAV has no data chunk')
+
+    format_tag, n_channels, framerate, _, block_align, bits = struct.unpack_from('<HHIIHH', fmt)
+    if format_tag == WAVE_FORMAT_EXTENSIBLE:
+        if len(fmt) < 40:
+            raise ValueError('WAVE_FORMAT_EXTENSIBLE fmt chunk is too short')
+        # The sub-format GUID starts with the plain format tag
+        format_tag = struct.unpack_from('<H', fmt, 24)[0]
+    if n_channels == 0 or block_align % n_channels:
+        raise ValueError(f'Bad block alignment: {block_align} bytes for {n_channels} channel(s)')
+    sample_width = block_align // n_channels
+    if (format_tag, sample_width) not in _SOURCE_DTYPES:
+        raise ValueError(f'Unsupported WAV format: tag {format_tag:#06x}, {bits}-bit in {sample_width} bytes')
+
+    return WavInfo(format_tag, n_channels, framerate, sample_width, bits, available // block_align,
+                   data.offset, data.size, chunks, available < data.size)
+
+def _skip(stream, n_bytes):
+    """Read past n_bytes of a stream in bounded pieces; returns how many were there."""
+    skipped = 0
+    while skipped < n_bytes:
+        piece = stream.read(min(STREAM_READ_BYTES, n_bytes - skipped))
+        if not piece:
+            break
+        skipped += len(piece)
+    return skipped
+
+def parse_stream(stream):
+    """
+    Parse the chunk list of a readable stream up to the start of its samples.
+
+    Chunk headers are read as they come and other payloads skipped, so
+    nothing but the fmt chunk is held in memory; the stream is left at the
+    first sample. Chunks after the data chunk are not listed, and the data
+    chunk is taken at its announced size (a stream that ends early just
+    yields fewer frames).
+    """
+    head = stream.read(12)
+    if len(head) < 12 or head[0:4] != b'RIFF' or head[8:12] != b'WAVE':
+        raise ValueError('Not a RIFF/WAVE file')
+    chunks = []
+    fmt = data = None
+    pos = 12
+    while data is None:
+        header = stream.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, size = struct.unpack('<4sI', header)
+        chunk = Chunk(chunk_id.decode('latin-1'), pos + 8, size)
+        chunks.append(chunk)
+        if chunk.id == 'data':
+            data = chunk
+            break
+        padded = size + (size & 1)
+        if chunk.id == 'fmt ':
+            fmt = stream.read(padded)[:size]
+        elif _skip(stream, padded) < padded:
+            break
+        pos = chunk.offset + padded
+    return _format_info(fmt, data, chunks, 0 if data is None else data.size)
+
+def _tpdf(start, count):
+    """
+    Triangular dither in [-1, 1) LSB for absolute sample indices start..start+count.
+
+    Hashed from the index rather than drawn from an RNG, so the same file
+    always converts to the same bytes no matter how it is read in blocks.
+    """
+    i = np.arange(start, start + count, dtype=np.uint32)
+    noise = []
+    for seed in (0x9E3779B9, 0x85EBCA6B):
+        x = i ^ np.uint32(seed)
+        x ^= x >> 16
+        x *= np.uint32(0x7FEB352D)
+        x ^= x >> 15
+        x *= np.uint32(0x846CA68B)
+        x ^= x >> 16
+        noise.append(x * (1.0 / 2 ** 32))
+    return noise[0] - noise[1]
+
+def _to_int16(raw, info, start, dither=True):
+    """Convert raw source samples (flat, starting at absolute sample index start) to int16."""
+    key = (info.format_tag, info.sample_width)
+    if key == (WAVE_FORMAT_PCM, 2):
+        return raw
+    if key == (WAVE_FORMAT_PCM, 1):
+        return ((raw.astype(np.int16) - 128) << 8).astype(np.int16)
+    if key == (WAVE_FORMAT_PCM, 3):
+        # Put the 3 bytes in the top of an int32 (sign comes along), i.e. value * 256
+        wide = np.zeros((len(raw) // 3, 4), dtype=np.uint8)
+        wide[:, 1:] = raw.reshape(-1, 3)
+        scaled = wide.view('<i4').ravel() * (1.0 / 65536)
+    elif key == (WAVE_FORMAT_PCM, 4):
+        scaled = raw * (1.0 / 65536)
+    else:
+        scaled = raw.astype(np.float64) * 32768.0
+    if dither:
+        scaled += _tpdf(start, len(scaled))
+    return np.clip(np.rint(scaled), -32768, 32767).astype(np.int16)
+
+class WavReader:
+    """
+    Read-side stand-in for wave.Wave_read that always delivers 16-bit frames.
+
+    getsampwidth() is 2 and readframes() returns int16 bytes whatever the
+    source format (.info has the original). Higher-resolution sources are
+    reduced to int16 with deterministic TPDF dither. read_array() returns
+    (frames, channels) int16 arrays instead of bytes; for 16-bit path and
+    BytesIO sources these are views of the memory-mapped data chunk.
+
+    Other file-like sources (zip members) are not buffered: the header is
+    parsed with parse_stream and each read pulls just its frames from the
+    stream, skipping forward or rewinding with seek(0) as needed, so
+    sequential reads stay bounded by the block size.
+    """
+
+    def __init__(self, source, dither=True):
+        self._file = self._map = self._stream = None
+        self._raw = None
+        if isinstance(source, (str, os.PathLike)):
+            self._file = open(source, 'rb')
+            try:
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                self._map = b''  # empty file; parse_chunks rejects it below
+            buf = self._map
+        elif hasattr(source, 'getbuffer'):
+            buf = source.getbuffer()
+        else:
+            buf = None
+            self._stream = source
+        try:
+            self.info = parse_chunks(buf) if buf is not None else parse_stream(source)
+        except Exception:
+            self.close()
+            raise
+        self.dither = dither
+        self._dtype = np.dtype(_SOURCE_DTYPES[(self.info.format_tag, self.info.sample_width)])
+        if buf is not None:
+            n_items = self.info.n_frames * self.info.n_channels * self.info.sample_width // self._dtype.itemsize
+            self._raw = np.frombuffer(buf, dtype=self._dtype, count=n_items, offset=self.info.data_offset)
+        self._stream_pos = self.info.data_offset  # where the stream is now
+        self._pos = 0
+
+    def _read_items(self, start, end):
+        """Raw source items start..end of the data chunk (fewer if a stream ends early)."""
+        if self._stream is None:
+            return self._raw[start:end]
+        itemsize = self._dtype.itemsize
+        offset = self.info.data_offset + start * itemsize
+        if offset < self._stream_pos:
+            self._stream.seek(0)
+            self._stream_pos = 0
+        self._stream_pos += _skip(self._stream, offset - self._stream_pos)
+        data = self._stream.read((end - start) * itemsize) if self._stream_pos == offset else b''
+        self._stream_pos += len(data)
+        return np.frombuffer(data, dtype=self._dtype, count=len(data) // itemsize)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._raw = None
+        if isinstance(self._map, mmap.mmap):
+            try:
+                self._map.close()
+            except BufferError:
+                pass  # arrays handed out still view it; it is unmapped when they go
+        if self._file is not None:
+            self._file.close()
+        self._file = self._map = self._stream = None  # a stream source stays open; its owner closes it
+
+    def getnchannels(self):
+        return self.info.n_channels
+
+    def getsampwidth(self):
+        return 2
+
+    def getframerate(self):
+        return self.info.framerate
+
+    def getnframes(self):
+        return self.info.n_frames
+
+    def getcomptype(self):
+        return 'NONE'
+
+    def getcompname(self):
+        return 'not compressed'
+
+    def getparams(self):
+        return WavParams(self.info.n_channels, 2, self.info.framerate, self.info.n_frames, 'NONE', 'not compressed')
+
+    def tell(self):
+        return self._pos
+
+    def setpos(self, pos):
+        if not 0 <= pos <= self.info.n_frames:
+            raise ValueError('position not in range')
+        self._pos = pos
+
+    def rewind(self):
+        self._pos = 0
+
+    def frames(self, start=0, count=None):
+        """int16 (frames, channels) for frames start..start+count, without moving the read position."""
+        end = self.info.n_frames if count is None else min(self.info.n_frames, start + count)
+        start = min(start, end)
+        ch = self.info.n_channels
+        per_frame = ch * (self.info.sample_width // self._dtype.itemsize)
+        raw = self._read_items(start * per_frame, end * per_frame)
+        raw = raw[:len(raw) - len(raw) % per_frame]
+        return _to_int16(raw, self.info, start * ch, self.dither).reshape(-1, ch)
+
+    def read_array(self, n_frames):
+        """Like readframes, but returns the int16 (frames, channels) array."""
+        block = self.frames(self._pos, n_frames)
+        self._pos += len(block)
+        return block
+
+    def readframes(self, n_frames):
+        return self.read_array(n_frames).tobytes()
+
+def open_wav(source, dither=True):
+    """Open a WAV path or readable file-like object for reading (see WavReader)."""
+    return WavReader(source, dither)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python wav_reader.py <file.wav> [...]')
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        try:
+            with open_wav(path) as wav:
+                info = wav.info
+        except (OSError, ValueError) as e:
+            print(f'✗ {path}: {e}\n')
+            continue
+        print(f'{path}: {describe(info)}, {info.n_channels} ch, {info.framerate} Hz, {info.n_frames} frames')
+        for chunk in info.chunks:
+            print(f'  {chunk.id!r:8s} @{chunk.offset:<8d} {chunk.size:10,d} bytes')
+        if info.truncated:
+            print(f'  ⚠ data chunk announces {info.data_size:,} bytes but the file ends early')
+        if info.data_offset != LEGACY_DATA_OFFSET:
+            print(f'  ⚠ samples start at byte {info.data_offset}, not {LEGACY_DATA_OFFSET}: '
+                  f'a fixed seek({LEGACY_DATA_OFFSET}) would play header bytes as audio')
+        print()